@@ -0,0 +1,52 @@
+# Regression tests for the rule-based lab-value extraction (backend/lab_values.py).
+# Run with: python -m pytest -q Tests/test_lab_values.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from lab_values import NOT_ASSESSED, extract_lab_values  # noqa: E402
+
+
+def _by_metric(text: str) -> dict:
+    return {lab["metric"]: lab for lab in extract_lab_values(text)}
+
+
+def test_cholesterol_with_trailing_qualifier_is_not_total():
+    labs = _by_metric("Cholesterol, LDL: 130 mg/dL\nCholesterol, Total: 220 mg/dL\nCholesterol, HDL: 45 mg/dL")
+    assert labs["Total Cholesterol"]["value"] == "220 mg/dL"
+    assert labs["Total Cholesterol"]["assessment"].startswith("High")
+    assert labs["LDL Cholesterol"]["value"] == "130 mg/dL"
+    assert labs["HDL Cholesterol"]["value"] == "45 mg/dL"
+
+
+def test_digit_inside_a_name_is_not_a_value():
+    labs = _by_metric("Hemoglobin A1c (HbA1c) 5.4%")
+    assert labs["Hemoglobin A1c"]["value"] == "5.4 %"
+    assert labs["Hemoglobin A1c"]["assessment"].startswith("Normal")
+
+
+@pytest.mark.parametrize("text, shown", [
+    ("TLC 9800 cells/cumm", "9800 cells/cumm (9.8 x10^9/L)"),
+    ("TLC 9800 cells/cu mm", "9800 cells/cu mm (9.8 x10^9/L)"),
+    ("WBC 7,500 /uL", "7,500 /uL (7.5 x10^9/L)"),
+])
+def test_counts_per_microlitre_are_converted(text, shown):
+    labs = _by_metric(text)
+    assert labs["WBC"]["value"] == shown
+    assert labs["WBC"]["assessment"].startswith("Normal")
+
+
+def test_value_without_unit_never_shows_the_table_unit():
+    labs = _by_metric("Total Cholesterol 220")
+    assert labs["Total Cholesterol"]["value"] == "220"
+    assert labs["Total Cholesterol"]["assessment"].startswith("High")
+
+
+def test_value_without_plausible_unit_is_not_assessed():
+    labs = _by_metric("HbA1c 900")
+    assert labs["Hemoglobin A1c"]["value"] == "900"
+    assert labs["Hemoglobin A1c"]["assessment"] == NOT_ASSESSED
@@ -4,9 +4,17 @@ from typing import TypedDict, Annotated
 from langchain_core.messages import HumanMessage
 # --- CHANGE: Import the base ChatModel class for more flexible type hinting ---
 from langchain_core.language_models.chat_models import BaseChatModel
-from PIL import Image
-import io
 import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from image_preprocess import ImageNormalizer, NormalizedImage, encode_lossless, original_if_smaller, OCR_NORMALIZE
+from metrics import metrics
+from ocr_cache import OcrResultCache, ocr_cache_key, OCR_CACHE_DB
+from report_pages import load_report_pages
 
 
 # In a larger project, this AppState could be in a shared types.py file
@@ -15,34 +23,11 @@ class AppState(TypedDict):
     health_issue: str
     extracted_text: str
     image_path: str
+    image_paths: list
+    extraction_error: str
 
 
-class DataExtractorAgent:
-    """Agent 0: Extracts text from a medical report image."""
-
-    # --- CHANGE: Accept any LangChain chat model, including Gemini or Ollama ---
-    def __init__(self, model: BaseChatModel):
-        self.model = model
-
-    def __call__(self, state: AppState):
-        print("---AGENT 0: Data Extractor---")
-
-        image_path = state.get("image_path")
-
-        if not image_path:
-            return {"extracted_text": "Error: No image path provided to the extractor agent."}
-
-        try:
-            # Open the image and convert to a base64 string for the model
-            with Image.open(image_path) as img:
-                buffer = io.BytesIO()
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                img.save(buffer, format="PNG")
-                img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-            # Use the standard HumanMessage format for multimodal input
-            extraction_prompt = """
+EXTRACTION_PROMPT = """
             Your task is to act as an Optical Character Recognition (OCR) engine.
             Transcribe the text from the provided medical report image.
             - Be as accurate as possible.
@@ -50,27 +35,131 @@ class DataExtractorAgent:
             - Do not add any commentary or analysis.
             - If the image is unreadable or contains no text, respond with only the phrase: "[UNREADABLE_IMAGE]".
             """
+# Bump whenever EXTRACTION_PROMPT changes so cached transcriptions from the old prompt are not reused
+EXTRACTION_PROMPT_VERSION = "1"
 
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": extraction_prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{img_base64}"},
-                    },
-                ]
-            )
+# Pages of a multi-page report are transcribed concurrently, at most this many at once
+EXTRACT_MAX_WORKERS = int(os.environ.get("EXTRACT_MAX_WORKERS", "4"))
+_page_executor = ThreadPoolExecutor(max_workers=EXTRACT_MAX_WORKERS, thread_name_prefix="extract-page")
 
+UNREADABLE_MARKER = "[UNREADABLE_IMAGE]"
+
+
+def is_cacheable_transcription(text: str) -> bool:
+    """Failed or empty transcriptions are never cached, so a re-upload gets another vision call."""
+    return bool(text and text.strip()) and UNREADABLE_MARKER not in text
+
+
+class DataExtractorAgent:
+    """Agent 0: Extracts text from a medical report image, PDF or set of page photos."""
+
+    # --- CHANGE: Accept any LangChain chat model, including Gemini or Ollama ---
+    def __init__(self, model: BaseChatModel, normalize: bool = OCR_NORMALIZE):
+        self.model = model
+        self.normalizer = ImageNormalizer() if normalize else None
+        self.ocr_cache = OcrResultCache() if OCR_CACHE_DB else None
+
+    def _transcribe(self, image: NormalizedImage, page_label: str, source_bytes: int = 0) -> str:
+        """One vision call for one normalized page, unless its transcription is already cached."""
+        # The same report uploaded again (in any session) normalizes to the same bytes
+        cache_key = ocr_cache_key(image.data, EXTRACTION_PROMPT_VERSION)
+        if self.ocr_cache:
+            cached_text = self.ocr_cache.get(cache_key)
+            if cached_text is not None and is_cacheable_transcription(cached_text):
+                print(f"---AGENT 0: Reusing the cached transcription of {page_label}.---")
+                return cached_text
+
+        img_base64 = base64.b64encode(image.data).decode("utf-8")
+        if image.is_original:
+            sent = "sending the upload as is"
+            metrics.increment("extractor.originals_sent")
+        else:
+            sent = f"normalized to {len(image.data)} bytes"
+            if source_bytes:
+                sent += f" ({1 - len(image.data) / source_bytes:.0%} smaller)"
+        print(f"---AGENT 0: {page_label}: {image.original_size[0]}x{image.original_size[1]} -> "
+              f"{image.final_size[0]}x{image.final_size[1]} {image.mime_type}, {source_bytes} bytes uploaded, "
+              f"{sent}, {len(img_base64)} bytes of payload.---")
+        # Original (uploaded) and sent sizes side by side, per page and in total
+        metrics.set_gauge("extractor.last_original_bytes", source_bytes)
+        metrics.set_gauge("extractor.last_sent_bytes", len(image.data))
+        metrics.set_gauge("extractor.last_payload_bytes", len(img_base64))
+        metrics.increment("extractor.original_bytes", source_bytes)
+        metrics.increment("extractor.sent_bytes", len(image.data))
+        metrics.increment("extractor.payload_bytes", len(img_base64))
+
+        # Use the standard HumanMessage format for multimodal input
+        message = HumanMessage(
+            content=[
+                {"type": "text", "text": EXTRACTION_PROMPT},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:{image.mime_type};base64,{img_base64}"},
+                },
+            ]
+        )
+
+        with metrics.timer("extractor.ocr_call"):
             response = self.model.invoke([message])
-            extracted_text = response.content
+        extracted_text = response.content
+        if self.ocr_cache and is_cacheable_transcription(extracted_text):
+            self.ocr_cache.put(cache_key, extracted_text)
+        return extracted_text
+
+    def _extract_page(self, page: Image.Image, page_label: str) -> str:
+        # Shrink the image before it is base64-embedded in the request
+        with metrics.timer("extractor.normalize"):
+            image = self.normalizer.normalize(page) if self.normalizer else encode_lossless(page)
+        image = original_if_smaller(image, page)
+        return self._transcribe(image, page_label, page.info.get("source_bytes", 0))
+
+    def _extract_pages(self, pages: list) -> str:
+        """Transcribes every page concurrently and joins the results in page order."""
+        futures = [_page_executor.submit(self._extract_page, page, f"page {number}")
+                   for number, page in enumerate(pages, start=1)]
+        sections = []
+        failed = 0
+        for number, future in enumerate(futures, start=1):
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"---AGENT 0: Page {number} failed: {e}---")
+                failed += 1
+                text = "[UNREADABLE_PAGE]"
+            sections.append(f"--- Page {number} ---\n{text}")
+        if failed == len(pages):
+            raise RuntimeError("None of the report pages could be transcribed.")
+        return "\n\n".join(sections)
 
-            print("---AGENT 0: Successfully extracted text from image.---")
-            return {"extracted_text": extracted_text}
+    def __call__(self, state: AppState):
+        print("---AGENT 0: Data Extractor---")
+
+        image_path = state.get("image_path")
+        image_paths = state.get("image_paths") or ([image_path] if image_path else [])
 
-        except FileNotFoundError:
-            print(f"Error: Image file not found at {image_path}")
-            return {"extracted_text": f"Error: Image file not found at {image_path}"}
+        if not image_paths:
+            return {"extracted_text": "", "extraction_error": "No image was provided."}
+
+        turn_start = time.perf_counter()
+        try:
+            pages = load_report_pages(image_paths)
+            print(f"---AGENT 0: {len(pages)} page(s) from {len(image_paths)} file(s), "
+                  f"{sum(os.path.getsize(p) for p in image_paths)} bytes on disk.---")
+            if len(pages) == 1:
+                extracted_text = self._extract_page(pages[0], "image")
+            else:
+                print(f"---AGENT 0: Transcribing {len(pages)} pages with up to {EXTRACT_MAX_WORKERS} in parallel.---")
+                extracted_text = self._extract_pages(pages)
+            metrics.record_timing("extractor.total", time.perf_counter() - turn_start)
+
+            print(f"---AGENT 0: Successfully extracted text from {len(pages)} page(s) "
+                  f"in {time.perf_counter() - turn_start:.2f}s.---")
+            return {"extracted_text": extracted_text, "extraction_error": ""}
+
+        # Failures are reported through extraction_error so after_extraction ends the turn
+        except FileNotFoundError as e:
+            print(f"Error: Image file not found: {e}")
+            return {"extracted_text": "", "extraction_error": "The uploaded file could not be found. Please upload it again."}
         except Exception as e:
             print(f"An error occurred during text extraction: {e}")
-            return {"extracted_text": f"An unexpected error occurred: {e}"}
-
+            return {"extracted_text": "", "extraction_error": str(e)}
@@ -2,12 +2,17 @@
 
 import os
 import json
-import re
 import requests
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Union
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_ollama import ChatOllama
 
+from circuit_breaker import HEDGE_REQUESTS, CircuitBreaker, CircuitOpenError, HedgedCaller
+from finder_rules import FinderRules
+from http_pool import DEFAULT_TIMEOUT, create_session
+from metrics import metrics
+from structured_output import StructuredOutputError, invoke_structured
+
 
 # --- State Definition ---
 class AppState(TypedDict):
@@ -15,24 +20,71 @@ class AppState(TypedDict):
     health_issue: str
 
 
+# --- MCP Server Configuration ---
+MCP_SERVER_URL = os.environ.get("MCP_SERVER_URL", "http://127.0.0.1:5001")
+
+LOCATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "specialty": {"type": ["string", "null"]},
+        "location": {"type": ["string", "null"]},
+    },
+    "required": ["specialty", "location"],
+}
+
+
 # --- Doctor Finder Agent with Improved State-Aware Logic ---
 class DoctorFinderAgent:
     def __init__(self, model: ChatOllama):
         self.model = model
+        # Shared by every lookup so the connection to the MCP server is kept alive
+        self.session = create_session()
+        # Specialty and location are taken from the gazetteer and keyword rules when possible
+        self.rules = FinderRules()
+        # Fails fast while the MCP server is down instead of waiting out the timeout every turn
+        self.breaker = CircuitBreaker("mcp_server", failure_exceptions=(requests.exceptions.RequestException,))
+        self.hedger = HedgedCaller("mcp_server") if HEDGE_REQUESTS else None
+
+    def _post_find_doctors(self, specialty: str, location: str) -> Union[list, dict]:
+        """
+        Returns the server's list of doctors, or {"error": message} when the server answered
+        with an error status it is not to blame for. Raises for an unreachable or broken server.
+        """
+        # This URL must exactly match the route and port in mcp_server.py
+        response = self.session.post(
+            f"{MCP_SERVER_URL}/find_doctors",
+            json={"specialty": specialty, "location": location},
+            timeout=DEFAULT_TIMEOUT
+        )
+        # Only an unreachable or broken server counts against the breaker. A 503 is the server
+        # reporting that its own upstream (Places) is unavailable, and 4xx answers come from a
+        # healthy server; both are passed through as {"error": ...}
+        if response.status_code >= 500 and response.status_code != 503:
+            response.raise_for_status()
+        if not response.ok:
+            metrics.increment("finder.mcp_error_responses")
+            try:
+                error = response.json().get("error")
+            except (requests.exceptions.RequestException, AttributeError):
+                error = None
+            return {"error": error or f"The doctor finder service answered HTTP {response.status_code}."}
+        return response.json()
 
     def find_nearby_doctors(self, specialty: str, location: str) -> str:
         """Calls the local MCP server to find doctors."""
         print(f"---Tool Executing (Finder Agent)---: Calling local MCP server for '{specialty}' in '{location}'")
         try:
-            # This URL must exactly match the route and port in mcp_server.py
-            response = requests.post(
-                "http://127.0.0.1:5001/find_doctors",
-                json={"specialty": specialty, "location": location},
-                timeout=15
-            )
-            response.raise_for_status()
-            return json.dumps(response.json())
+            with metrics.timer("finder.mcp_request"):
+                if self.hedger:
+                    doctors = self.breaker.call(self.hedger.call, self._post_find_doctors, specialty, location)
+                else:
+                    doctors = self.breaker.call(self._post_find_doctors, specialty, location)
+            return json.dumps(doctors)
+        except CircuitOpenError as e:
+            print(f"---Tool Error---: {e} Skipping the MCP server call.")
+            return json.dumps({"error": f"The doctor finder service is temporarily unavailable: {e}"})
         except requests.exceptions.RequestException as e:
+            metrics.increment("finder.mcp_errors")
             print(f"---Tool Error---: Could not connect to MCP server: {e}")
             return json.dumps({"error": f"Failed to connect to the doctor finder service: {e}"})
 
@@ -42,6 +94,16 @@ class DoctorFinderAgent:
         history = state.get("messages", [])
         health_issue = state.get("health_issue", "")
 
+        last_user_message = next((msg.content for msg in reversed(history) if msg.type == "human"), "")
+        with metrics.timer("finder.rules"):
+            extracted = self.rules.extract(last_user_message, health_issue)
+        if extracted:
+            specialty, location = extracted
+            metrics.increment("finder.rules_hits")
+            print(f"---AGENT 4: Rules found '{specialty}' in '{location}', skipping the LLM parse.---")
+            return self._respond(specialty, location)
+        metrics.increment("finder.llm_parses")
+
         conversation_history = "\n".join([f"{msg.type}: {msg.content}" for msg in history])
 
         parsing_prompt = f"""You are an intelligent assistant. Your task is to extract the medical specialty and location from a user's request.
@@ -54,28 +116,16 @@ class DoctorFinderAgent:
 
         Analyze the LAST user message to find the location.
 
-        Respond with ONLY a JSON object containing the "specialty" and "location", enclosed in markdown code fences.
+        Respond with ONLY a JSON object containing the "specialty" and "location".
         For example:
-        ```json
         {{"specialty": "Cardiology", "location": "Bhopal, India"}}
-        ```
         If you cannot find a clear location, return:
-        ```json
         {{"specialty": null, "location": null}}
-        ```
         """
 
         try:
-            response_str = self.model.invoke(parsing_prompt).content
-
-            match = re.search(r"```json\s*(\{.*?\})\s*```", response_str, re.DOTALL)
-            if not match:
-                match = re.search(r'(\{.*?\})', response_str, re.DOTALL)
-                if not match:
-                    raise json.JSONDecodeError("No JSON object found in LLM response", response_str, 0)
-
-            json_str = match.group(1)
-            parsed_info = json.loads(json_str)
+            parsed_info = invoke_structured(self.model, [HumanMessage(content=parsing_prompt)],
+                                            LOCATION_SCHEMA, "finder")
 
             specialty = parsed_info.get("specialty")
             location = parsed_info.get("location")
@@ -84,11 +134,14 @@ class DoctorFinderAgent:
                 clarification_message = "I can help with that. To find the right doctor, could you please provide your current city or area?"
                 return {"messages": [AIMessage(content=clarification_message)]}
 
-        except (json.JSONDecodeError, AttributeError) as e:
+        except StructuredOutputError as e:
             print(f"Error parsing LLM response for finder: {e}")
             clarification_message = "I had trouble understanding the request. Could you please rephrase it to include both a medical issue and a specific location?"
             return {"messages": [AIMessage(content=clarification_message)]}
 
+        return self._respond(specialty, location)
+
+    def _respond(self, specialty: str, location: str):
         doctors_json = self.find_nearby_doctors(specialty, location)
         doctors_data = json.loads(doctors_json)
 
@@ -7,6 +7,8 @@ from langchain_core.messages import AIMessage, HumanMessage
 from langchain.tools import tool
 from langchain_ollama import ChatOllama
 
+from prefetch import prefetcher
+
 
 # In a larger project, this AppState could be in a shared types.py file
 class AppState(TypedDict):
@@ -63,7 +65,15 @@ class RagAgent:
         health_issue_context = state['health_issue']
 
         # Step 1: Retrieve ALL context for the topic. This is more reliable.
-        retrieved_context = knowledge_base.get_all_context_for_issue(health_issue_context)
+        # The entry point may already have fetched it while the router was deciding.
+        prefetched = prefetcher.claim("rag_context", health_issue_context)
+        try:
+            retrieved_context = prefetched.result() if prefetched else None
+        except Exception as e:
+            print(f"---RAG Agent---: Prefetched context failed: {e}")
+            retrieved_context = None
+        if retrieved_context is None:
+            retrieved_context = knowledge_base.get_all_context_for_issue(health_issue_context)
 
         # Step 2: Re-frame the user's question to be more explicit for the LLM
         reframed_question = f"What is the answer to the question '{user_question}' in the context of '{health_issue_context}'?"
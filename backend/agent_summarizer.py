@@ -1,10 +1,17 @@
 # File: agent_summarizer.py
 
 import json
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, Annotated
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_ollama import ChatOllama
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from lab_values import extract_lab_values, load_reference_ranges
+from metrics import metrics
+from structured_output import invoke_structured
 
 
 # --- State Definition ---
@@ -13,31 +20,96 @@ class AppState(TypedDict):
     extracted_text: str
 
 
+# --- Long-Report Configuration ---
+# Reports longer than this are summarized section by section (map) and merged (reduce)
+LONG_REPORT_CHARS = int(os.environ.get("SUMMARIZER_LONG_REPORT_CHARS", "6000"))
+SECTION_CHARS = int(os.environ.get("SUMMARIZER_SECTION_CHARS", "3000"))
+SUMMARIZER_MAX_WORKERS = int(os.environ.get("SUMMARIZER_MAX_WORKERS", "4"))
+# Page breaks from the extractor first, then paragraphs, then lines
+SECTION_SEPARATORS = ["\n--- Page ", "\n\n", "\n", " "]
+
+_section_executor = ThreadPoolExecutor(max_workers=SUMMARIZER_MAX_WORKERS, thread_name_prefix="summarize-section")
+
+# The narrative part of the summary; lab_analysis is added locally
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "key_observations": {"type": "array", "items": {"type": "string"}},
+        "areas_for_improvement": {"type": "array", "items": {"type": "string"}},
+        "disclaimer": {"type": "string"},
+    },
+    "required": ["key_observations", "areas_for_improvement", "disclaimer"],
+}
+
+DEFAULT_DISCLAIMER = ("This summary is generated automatically and is not a medical diagnosis. "
+                      "Please discuss your results with a qualified healthcare professional.")
+
+
+def merge_partial_summaries(partials: list) -> dict:
+    """Reduce step: concatenates the per-section lists in section order, dropping repeated items."""
+    merged = {"key_observations": [], "areas_for_improvement": []}
+    for key, items in merged.items():
+        seen = set()
+        for partial in partials:
+            for item in partial.get(key) or []:
+                normalized = re.sub(r"\W+", " ", str(item)).strip().lower()
+                if normalized and normalized not in seen:
+                    seen.add(normalized)
+                    items.append(item)
+    merged["disclaimer"] = next((p["disclaimer"] for p in partials if p.get("disclaimer")), None)
+    return merged
+
+
 # --- Medical Report Summarizer Agent ---
 class MedicalReportSummarizerAgent:
     def __init__(self, model: ChatOllama):
         self.model = model
+        # Lab values are found and assessed locally; the LLM only writes the narrative fields
+        self.reference_ranges = load_reference_ranges()
         self.system_prompt = """You are an expert AI medical analyst. Your task is to analyze the provided medical report text and return a structured JSON summary.
 
-        The JSON object must have the following keys: "key_observations", "lab_analysis", "areas_for_improvement", "disclaimer".
+        The JSON object must have the following keys: "key_observations", "areas_for_improvement", "disclaimer".
 
         - **key_observations**: A list of strings summarizing the key points from the doctor's narrative notes or impression.
-        - **lab_analysis**: A list of objects, where each object has "metric", "value", and "assessment" keys. Compare each lab value against the provided healthy ranges.
-        - **areas_for_improvement**: A list of strings containing general, actionable advice based on the analysis.
+        - **areas_for_improvement**: A list of strings containing general, actionable advice based on the report and the lab assessments provided with it.
         - **disclaimer**: A standard safety disclaimer.
 
-        **Healthy Ranges for Lab Values:**
-        - Blood Pressure: < 120/80 mmHg
-        - Total Cholesterol: < 200 mg/dL
-        - LDL Cholesterol: < 100 mg/dL
-        - HDL Cholesterol: > 60 mg/dL
-        - Triglycerides: < 150 mg/dL
-        - Hemoglobin A1c: < 5.7 %
-        - WBC: 4.5 - 11.0 x10^9/L
-        - Hemoglobin: 13.5-17.5 g/dL (male), 12.0-15.5 g/dL (female)
-
-        Respond with ONLY the JSON object, enclosed in markdown code fences (```json ... ```).
+        Do not list or re-assess the individual lab values; they have already been analyzed.
+
+        Respond with ONLY the JSON object.
         """
+        self.section_splitter = RecursiveCharacterTextSplitter(chunk_size=SECTION_CHARS, chunk_overlap=0,
+                                                               separators=SECTION_SEPARATORS)
+
+    def _summarize(self, report_part: str, lab_lines: str) -> dict:
+        # The user message is the extracted text from the previous step
+        messages_for_llm = [
+            HumanMessage(content=self.system_prompt),
+            HumanMessage(content=f"{report_part}\n\nLab assessments:\n{lab_lines or '- None found'}")
+        ]
+        with metrics.timer("summarizer.llm"):
+            return invoke_structured(self.model, messages_for_llm, SUMMARY_SCHEMA, "summarizer")
+
+    def _summarize_sections(self, report_text: str, lab_lines: str) -> dict:
+        """Long-report mode: every section is summarized concurrently, then the partial summaries are merged."""
+        sections = self.section_splitter.split_text(report_text)
+        print(f"---AGENT 3: Long report ({len(report_text)} chars), summarizing {len(sections)} sections.---")
+        futures = [
+            _section_executor.submit(
+                self._summarize,
+                f"Here is section {number} of {len(sections)} of a medical report to analyze:\n\n{section}",
+                lab_lines)
+            for number, section in enumerate(sections, start=1)
+        ]
+        partials = []
+        for number, future in enumerate(futures, start=1):
+            try:
+                partials.append(future.result())
+            except Exception as e:
+                print(f"---AGENT 3: Section {number} could not be summarized: {e}---")
+        if not partials:
+            raise ValueError("None of the report sections could be summarized.")
+        return merge_partial_summaries(partials)
 
     def __call__(self, state: AppState):
         print("---AGENT 3: Medical Report Summarizer---")
@@ -46,31 +118,32 @@ class MedicalReportSummarizerAgent:
         if not report_text:
             return {"messages": [AIMessage(content="There was no report text to summarize. Please provide a report.")]}
 
-        # The user message is the extracted text from the previous step
-        messages_for_llm = [
-            HumanMessage(content=self.system_prompt),
-            HumanMessage(content=f"Here is the medical report to analyze:\n\n{report_text}")
-        ]
+        with metrics.timer("summarizer.lab_extraction"):
+            lab_analysis = extract_lab_values(report_text, self.reference_ranges)
+        print(f"---AGENT 3: Assessed {len(lab_analysis)} lab values locally.---")
+        lab_lines = "\n".join(f"- {lab['metric']}: {lab['value']} -> {lab['assessment']}" for lab in lab_analysis)
 
         try:
-            response = self.model.invoke(messages_for_llm)
-
-            # More robust parsing to find the JSON block
-            match = re.search(r"```json\s*(\{.*?\})\s*```", response.content, re.DOTALL)
-            if not match:
-                # Fallback if markdown fences are missing
-                match = re.search(r'(\{.*?\})', response.content, re.DOTALL)
-                if not match:
-                    raise json.JSONDecodeError("No JSON object found in LLM response", response.content, 0)
-
-            json_str = match.group(1)
-
-            # The agent's final output is the clean JSON string for the frontend
-            final_response = f"Here is the summary of the report:\n```json\n{json_str}\n```"
-
-            return {"messages": [AIMessage(content=final_response)]}
-
+            if len(report_text) > LONG_REPORT_CHARS:
+                narrative = self._summarize_sections(report_text, lab_lines)
+            else:
+                narrative = self._summarize(f"Here is the medical report to analyze:\n\n{report_text}", lab_lines)
         except Exception as e:
             print(f"Error during summarization: {e}")
-            error_message = "I'm sorry, I encountered an error while summarizing the report. The format of the report might be unusual. Please try again."
-            return {"messages": [AIMessage(content=error_message)]}
+            if not lab_analysis:
+                error_message = "I'm sorry, I encountered an error while summarizing the report. The format of the report might be unusual. Please try again."
+                return {"messages": [AIMessage(content=error_message)]}
+            # The locally computed lab analysis is still worth returning
+            narrative = {}
+
+        summary = {
+            "key_observations": narrative.get("key_observations", []),
+            "lab_analysis": lab_analysis,
+            "areas_for_improvement": narrative.get("areas_for_improvement", []),
+            "disclaimer": narrative.get("disclaimer") or DEFAULT_DISCLAIMER,
+        }
+
+        # The agent's final output is the clean JSON string for the frontend
+        final_response = f"Here is the summary of the report:\n```json\n{json.dumps(summary, ensure_ascii=False, indent=2)}\n```"
+
+        return {"messages": [AIMessage(content=final_response)]}
@@ -1,13 +1,29 @@
 # File: agent_symptom.py
 
+import json
 import os
 import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, Annotated
 
+import numpy as np
+from langchain_core.documents import Document
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_community.vectorstores import FAISS
 from langchain_ollama import OllamaEmbeddings, ChatOllama
 
+from bm25_index import BM25Index
+from category_classifier import CategoryClassifier
+from centroid_index import FocusAreaCentroidIndex
+from embedding_cache import CachedEmbeddings
+from index_store import FAISS_FILE_NAME, load_vector_store, read_manifest, restricted_search
+from metrics import metrics
+from prefetch import prefetcher
+from structured_output import invoke_structured
+
 
 # --- State Definition ---
 class AppState(TypedDict):
@@ -15,22 +31,80 @@ class AppState(TypedDict):
     health_issue: str
 
 
+# --- Retrieval Configuration ---
+# "vector": plain top-k passage search over the whole index.
+# "centroid": pick the nearest focus areas from their centroids first, then the best
+# passage inside each of those areas (needs the centroids written by preprocess.py).
+# "hybrid": BM25 keyword hits and vector hits merged by reciprocal rank fusion
+# (needs the BM25 index written by preprocess.py).
+RETRIEVAL_MODES = ("vector", "centroid", "hybrid")
+SYMPTOM_RETRIEVAL_MODE = os.environ.get("SYMPTOM_RETRIEVAL_MODE", "vector")
+PASSAGES_PER_FOCUS_AREA = int(os.environ.get("SYMPTOM_PASSAGES_PER_FOCUS_AREA", "1"))
+# Candidates taken from each arm before fusion, and the usual RRF damping constant
+HYBRID_CANDIDATES = int(os.environ.get("SYMPTOM_HYBRID_CANDIDATES", "20"))
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    """Merges several ranked id lists; ids ranked high by any list, or ranked by several, come first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
 # --- Symptom Knowledge Base (for initial filtering) ---
 class SymptomKnowledgeBase:
-    def __init__(self, file_path="faiss_index", model_name="nomic-embed-text"):
+    def __init__(self, file_path="faiss_index", model_name="nomic-embed-text", k=5,
+                 retrieval_mode=SYMPTOM_RETRIEVAL_MODE):
         print("---Symptom Knowledge Base: Initializing---")
         self.retriever = None
+        self.embedding_model = None
+        self.vector_store = None
+        self.centroids = None
+        self.bm25 = None
+        self.category_classifier = None
+        self.k = k
+        self.retrieval_mode = retrieval_mode
+        self.model_name = model_name
+        self.build_id = None
         try:
             print(f"Loading pre-processed FAISS index from {file_path}...")
             if not os.path.exists(file_path):
                 raise FileNotFoundError("FAISS index directory not found.")
 
-            embedding_model = OllamaEmbeddings(model=model_name)
-            vector_store = FAISS.load_local(file_path, embedding_model, allow_dangerous_deserialization=True)
+            # Query embeddings are cached process-wide, so repeated symptoms skip Ollama
+            self.embedding_model = CachedEmbeddings(OllamaEmbeddings(model=model_name), model_name)
+            self.vector_store = load_vector_store(file_path, self.embedding_model)
             # Retrieve more candidates for better re-ranking
-            self.retriever = vector_store.as_retriever(search_kwargs={'k': 5})
+            self.retriever = self.vector_store.as_retriever(search_kwargs={'k': k})
+            # Indexes built before the manifest existed are identified by their modification time
+            self.build_id = (read_manifest(file_path).get("build_id")
+                             or f"mtime:{os.path.getmtime(os.path.join(file_path, FAISS_FILE_NAME))}")
             print("Successfully loaded the symptom knowledge base.")
 
+            if CategoryClassifier.exists(file_path):
+                self.category_classifier = CategoryClassifier(file_path)
+
+            if retrieval_mode not in RETRIEVAL_MODES:
+                print(f"Unknown retrieval mode '{retrieval_mode}'. Falling back to 'vector'.")
+                self.retrieval_mode = "vector"
+            elif retrieval_mode == "centroid":
+                if FocusAreaCentroidIndex.exists(file_path):
+                    self.centroids = FocusAreaCentroidIndex(file_path)
+                    print(f"Loaded centroids for {len(self.centroids.focus_areas)} focus areas.")
+                else:
+                    print("No focus-area centroids found; re-run preprocess.py. Using vector retrieval.")
+                    self.retrieval_mode = "vector"
+            elif retrieval_mode == "hybrid":
+                if BM25Index.exists(file_path):
+                    self.bm25 = BM25Index(file_path)
+                    print(f"Loaded the BM25 index ({len(self.bm25.terms)} terms).")
+                else:
+                    print("No BM25 index found; re-run preprocess.py. Using vector retrieval.")
+                    self.retrieval_mode = "vector"
+
         except ImportError:
             print("CRITICAL ERROR: The 'faiss-cpu' or 'faiss-gpu' library is not installed.")
         except FileNotFoundError:
@@ -38,67 +112,277 @@ class SymptomKnowledgeBase:
         except Exception as e:
             print(f"An error occurred while initializing the Symptom Knowledge Base: {e}")
 
+    def search(self, query: str) -> list:
+        if self.retrieval_mode == "centroid":
+            return self._centroid_search(query)
+        if self.retrieval_mode == "hybrid":
+            return self._hybrid_search(query)
+        return self.retriever.invoke(query)
+
+    def _document(self, doc_id: int):
+        return self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[int(doc_id)])
+
+    def _centroid_search(self, query: str) -> list:
+        """Two-stage lookup: nearest focus-area centroids, then supporting passages within each area."""
+        query_vector = np.array(self.embedding_model.embed_query(query), dtype=np.float32)
+        with metrics.timer("symptom.centroid_stage"):
+            focus_areas = self.centroids.nearest_focus_areas(query_vector, self.k)
+
+        docs = []
+        with metrics.timer("symptom.passage_stage"):
+            for focus_area in focus_areas:
+                members = self.centroids.members(focus_area)
+                if not len(members):
+                    continue
+                _, ids = restricted_search(self.vector_store.index, query_vector,
+                                           min(PASSAGES_PER_FOCUS_AREA, len(members)), members)
+                for i in ids[0]:
+                    if i < 0:
+                        continue
+                    doc = self._document(i)
+                    # A deduplicated answer may stand for several areas; report the one it was found under
+                    metadata = {k: v for k, v in doc.metadata.items() if k != "sources"}
+                    metadata["focus_area"] = focus_area
+                    docs.append(Document(page_content=doc.page_content, metadata=metadata))
+        return docs
+
+    def _hybrid_search(self, query: str) -> list:
+        """Vector and BM25 arms, each timed separately, fused by reciprocal rank."""
+        with metrics.timer("symptom.vector_arm"):
+            query_vector = np.array(self.embedding_model.embed_query(query), dtype=np.float32).reshape(1, -1)
+            _, vector_ids = self.vector_store.index.search(query_vector, HYBRID_CANDIDATES)
+        with metrics.timer("symptom.bm25_arm"):
+            bm25_ids, _ = self.bm25.search(query, HYBRID_CANDIDATES)
+        fused = reciprocal_rank_fusion([vector_ids[0][vector_ids[0] >= 0], bm25_ids])
+        return [self._document(i) for i in fused[:self.k]]
+
+
+def candidate_focus_areas(docs: list) -> list:
+    """
+    Distinct focus areas of the retrieved answers, in rank order. Deduplicated answers
+    carry every source row in their "sources" metadata, so one hit can yield several areas.
+    """
+    candidates = []
+    for doc in docs:
+        for source in doc.metadata.get("sources") or [doc.metadata]:
+            if source["focus_area"] not in candidates:
+                candidates.append(source["focus_area"])
+    return candidates
+
+
+# --- Symptom Result Cache ---
+SYMPTOM_RESULT_CACHE_SIZE = int(os.environ.get("SYMPTOM_RESULT_CACHE_SIZE", "1000"))
+SYMPTOM_RESULT_CACHE_TTL = float(os.environ.get("SYMPTOM_RESULT_CACHE_TTL", str(24 * 3600)))
+# Optional SQLite file that keeps results (and so users' symptom text) across restarts;
+# by default they are kept in memory only
+SYMPTOM_RESULT_CACHE_DB = os.environ.get("SYMPTOM_RESULT_CACHE_DB", "")
+# Cosine similarity above which a differently worded description reuses a cached result; 0 disables it
+SYMPTOM_RESULT_CACHE_SIMILARITY = float(os.environ.get("SYMPTOM_RESULT_CACHE_SIMILARITY", "0"))
+
+
+def normalize_symptoms(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text.lower())).strip()
+
+
+class SymptomResultCache:
+    """
+    Identified focus area and candidate list per normalized symptom description, shared
+    across sessions. Entries expire after ttl seconds, the least recently used are evicted
+    beyond max_entries, and every entry is tagged with the generation (index build, retrieval
+    and classifier modes, and models) it was computed under, so changing any of them invalidates it.
+    """
+
+    def __init__(self, generation: str, max_entries: int = SYMPTOM_RESULT_CACHE_SIZE,
+                 ttl: float = SYMPTOM_RESULT_CACHE_TTL, db_path: str = SYMPTOM_RESULT_CACHE_DB,
+                 similarity: float = SYMPTOM_RESULT_CACHE_SIMILARITY):
+        self.generation = generation
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> (created_at, result dict, unit vector or None)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS symptom_results (key TEXT PRIMARY KEY, generation TEXT, "
+                             "created_at REAL, result TEXT, vector BLOB)")
+            self._load()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl
+        self._db.execute("DELETE FROM symptom_results WHERE generation != ? OR created_at < ?",
+                         (self.generation, cutoff))
+        self._db.commit()
+        rows = self._db.execute("SELECT key, created_at, result, vector FROM symptom_results "
+                                "ORDER BY created_at DESC LIMIT ?", (self.max_entries,)).fetchall()
+        for key, created_at, result, vector in reversed(rows):
+            vector = np.frombuffer(vector, dtype=np.float32) if vector else None
+            self._entries[key] = (created_at, json.loads(result), vector)
+        if rows:
+            print(f"---Symptom Result Cache---: Restored {len(rows)} cached results.")
+
+    def _delete(self, keys: list):
+        # Caller holds the lock
+        for key in keys:
+            self._entries.pop(key, None)
+        if self._db is not None and keys:
+            self._db.executemany("DELETE FROM symptom_results WHERE key = ?", [(key,) for key in keys])
+            self._db.commit()
+
+    def _expire(self):
+        # Caller holds the lock
+        cutoff = time.time() - self.ttl
+        self._delete([key for key, (created_at, _, _) in self._entries.items() if created_at < cutoff])
+
+    def get(self, symptoms: str, query_vector=None):
+        """Cached result for these symptoms, or for a similar enough description when a vector is given."""
+        key = normalize_symptoms(symptoms)
+        with self._lock:
+            self._expire()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                metrics.increment("symptom.result_cache.hits")
+                return self._entries[key][1]
+            if query_vector is not None and self.similarity > 0:
+                best_key, best_score = None, self.similarity
+                query = np.asarray(query_vector, dtype=np.float32)
+                query = query / (np.linalg.norm(query) or 1.0)
+                for entry_key, (_, _, vector) in self._entries.items():
+                    if vector is not None and float(vector @ query) >= best_score:
+                        best_key, best_score = entry_key, float(vector @ query)
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    metrics.increment("symptom.result_cache.similar_hits")
+                    return self._entries[best_key][1]
+            metrics.increment("symptom.result_cache.misses")
+            return None
+
+    def put(self, symptoms: str, result: dict, query_vector=None):
+        key = normalize_symptoms(symptoms)
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        created_at = time.time()
+        with self._lock:
+            self._entries[key] = (created_at, result, vector)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO symptom_results VALUES (?, ?, ?, ?, ?)",
+                                 (key, self.generation, created_at, json.dumps(result),
+                                  vector.tobytes() if vector is not None else None))
+            self._delete(evicted)
+            if self._db is not None:
+                self._db.commit()
+            metrics.set_gauge("symptom.result_cache.entries", len(self._entries))
+
 
 # --- Global Instances ---
 symptom_kb = SymptomKnowledgeBase()
 
 
 # --- Symptom Identifier Agent with Hierarchical Reasoning ---
-class SymptomIdentifierAgent:
-    def __init__(self, model: ChatOllama):
-        self.model = model
+SYMPTOM_CATEGORIES = [
+    "Cardiovascular",
+    "Neurological",
+    "Respiratory",
+    "Dermatological",
+    "Musculoskeletal",
+    "Gastrointestinal",
+    "General/Systemic",
+]
 
-    def __call__(self, state: AppState):
-        print("---AGENT 1: Symptom Identifier---")
+# "parallel": classification runs alongside retrieval, then a separate rerank call.
+# "single_call": one LLM call returns both the category and the best option as JSON.
+PIPELINE_MODES = ("parallel", "single_call")
+SYMPTOM_PIPELINE_MODE = os.environ.get("SYMPTOM_PIPELINE_MODE", "parallel")
+# Reply of the single_call mode
+CLASSIFY_AND_RERANK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string"},
+        "choice": {"type": "integer"},
+    },
+    "required": ["category", "choice"],
+}
 
-        user_input = state['messages'][-1].content.lower()
-        if "analyze" in user_input and "symptoms" in user_input:
-            return {"messages": [
-                AIMessage(content="Of course. Please describe the symptoms you are experiencing in detail.")]}
+# "llm": the category always comes from an LLM call.
+# "prototype": nearest category prototype (built by preprocess.py) from the symptom embedding;
+# the LLM is only asked when the prototype confidence is below the threshold.
+CLASSIFIER_MODES = ("llm", "prototype")
+SYMPTOM_CLASSIFIER_MODE = os.environ.get("SYMPTOM_CLASSIFIER_MODE", "llm")
+PROTOTYPE_MIN_CONFIDENCE = float(os.environ.get("SYMPTOM_PROTOTYPE_MIN_CONFIDENCE", "0.6"))
 
-        if not symptom_kb.retriever:
-            return {
-                "messages": [AIMessage(content="My symptom knowledge base failed to load.")],
-                "health_issue": "ERROR: KB_FAILED_TO_LOAD",
-            }
+# Shared by all agent instances; retrieval and classification each take one worker per turn
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="symptom-agent")
 
-        symptoms = state['messages'][-1].content
-        print(f"---Agent Logic---: Starting hierarchical search for: '{symptoms}'")
 
-        try:
-            # Step 1: Broad candidate retrieval
-            retrieved_docs = symptom_kb.retriever.invoke(symptoms)
-            if not retrieved_docs:
-                raise ValueError("No relevant documents found in the knowledge base.")
+class SymptomIdentifierAgent:
+    def __init__(self, model: ChatOllama, mode: str = SYMPTOM_PIPELINE_MODE,
+                 classifier_mode: str = SYMPTOM_CLASSIFIER_MODE):
+        self.model = model
+        if mode not in PIPELINE_MODES:
+            print(f"Unknown symptom pipeline mode '{mode}'. Falling back to 'parallel'.")
+            mode = "parallel"
+        self.mode = mode
+        if classifier_mode not in CLASSIFIER_MODES:
+            print(f"Unknown symptom classifier mode '{classifier_mode}'. Falling back to 'llm'.")
+            classifier_mode = "llm"
+        if classifier_mode == "prototype" and symptom_kb.category_classifier is None:
+            print("No category prototypes found; re-run preprocess.py. Classifying with the LLM.")
+            classifier_mode = "llm"
+        self.classifier_mode = classifier_mode
+        # Created here because the generation depends on the effective classifier mode and model
+        model_name = getattr(model, "model", None) or type(model).__name__
+        self.result_cache = SymptomResultCache(
+            generation=(f"{symptom_kb.build_id}:{symptom_kb.retrieval_mode}:{classifier_mode}:"
+                        f"{symptom_kb.model_name}:{model_name}"))
+
+    def _retrieve(self, symptoms: str) -> list:
+        with metrics.timer("symptom.retrieval"):
+            return symptom_kb.search(symptoms)
+
+    def _classify(self, symptoms: str) -> str:
+        """Classification into a body system/category, locally when the prototypes are confident."""
+        if self.classifier_mode == "prototype":
+            with metrics.timer("symptom.prototype_classification"):
+                category, confidence = symptom_kb.category_classifier.classify(
+                    symptom_kb.embedding_model.embed_query(symptoms))
+            if confidence >= PROTOTYPE_MIN_CONFIDENCE:
+                metrics.increment("symptom.prototype_classified")
+                return category
+            print(f"---Agent Logic---: Prototype match '{category}' too unsure ({confidence:.2f}). Asking the LLM.")
+            metrics.increment("symptom.prototype_llm_fallbacks")
+        return self._classify_with_llm(symptoms)
 
-            # Step 2: LLM-powered classification into a body system/category
-            # --- FIX: Using a much more forceful and specific prompt ---
-            classification_prompt = f"""Your task is to classify the following symptoms into one of the provided categories.
+    def _classify_with_llm(self, symptoms: str) -> str:
+        """LLM-powered classification into a body system/category."""
+        categories = "\n".join(f"            - {c}" for c in SYMPTOM_CATEGORIES)
+        # --- FIX: Using a much more forceful and specific prompt ---
+        classification_prompt = f"""Your task is to classify the following symptoms into one of the provided categories.
 
             Available Categories:
-            - Cardiovascular
-            - Neurological
-            - Respiratory
-            - Dermatological
-            - Musculoskeletal
-            - Gastrointestinal
-            - General/Systemic
+{categories}
 
             User's Symptoms: "{symptoms}"
 
             **CRITICAL INSTRUCTION**: Respond with ONLY the single most appropriate category name from the list above. Do not add any explanation or conversational text.
             """
+        with metrics.timer("symptom.classification"):
             category_response = self.model.invoke(classification_prompt)
-            # Clean the response to ensure it's just one of the categories
-            category = category_response.content.strip().split()[0].replace(",", "")
-            print(f"---Agent Logic---: Classified symptoms as '{category}'")
+        # Clean the response to ensure it's just one of the categories
+        return category_response.content.strip().split()[0].replace(",", "")
 
-            # Step 3: Intelligent Re-ranking using the category as context
-            context_for_rerank = ""
-            for i, doc in enumerate(retrieved_docs):
-                context_for_rerank += f"Option [{i + 1}] (Topic: {doc.metadata['focus_area']})\n"
+    def _rerank(self, symptoms: str, category: str, candidates: list) -> str:
+        """Intelligent re-ranking using the category as context."""
+        context_for_rerank = ""
+        for i, focus_area in enumerate(candidates):
+            context_for_rerank += f"Option [{i + 1}] (Topic: {focus_area})\n"
 
-            rerank_prompt = f"""You are a medical expert. Your task is to perform a differential diagnosis.
+        rerank_prompt = f"""You are a medical expert. Your task is to perform a differential diagnosis.
             User's Symptoms: "{symptoms}"
             The primary medical category for these symptoms is: "{category}"
 
@@ -109,22 +393,115 @@ class SymptomIdentifierAgent:
             Respond with ONLY the number of the best match (e.g., "1", "2", etc.).
             """
 
+        with metrics.timer("symptom.rerank"):
             best_choice_response = self.model.invoke(rerank_prompt)
-            match = re.search(r'\d+', best_choice_response.content)
-            if match:
-                choice_index = int(match.group(0)) - 1
-                if 0 <= choice_index < len(retrieved_docs):
-                    identified_issue = retrieved_docs[choice_index].metadata['focus_area']
-                    print(f"---Agent Logic---: Final identified issue: {identified_issue}")
-                else:
-                    raise ValueError("LLM returned an out-of-bounds number.")
+        match = re.search(r'\d+', best_choice_response.content)
+        if not match:
+            raise ValueError("Could not parse LLM re-rank response.")
+        return self._pick(candidates, int(match.group(0)))
+
+    def _classify_and_rerank(self, symptoms: str, candidates: list):
+        """Single-call mode: category and best option come back together as structured output."""
+        options = "\n".join(f"            [{i + 1}] {focus_area}" for i, focus_area in enumerate(candidates))
+        prompt = f"""You are a medical expert performing a differential diagnosis.
+            User's Symptoms: "{symptoms}"
+
+            Step 1: Classify the symptoms into exactly one of these categories: {", ".join(SYMPTOM_CATEGORIES)}.
+            Step 2: Considering the symptoms and that category, choose the most specific and likely topic:
+{options}
+
+            Respond with ONLY a JSON object of the form {{"category": "<category>", "choice": <option number>}}.
+            """
+        with metrics.timer("symptom.single_call"):
+            parsed = invoke_structured(self.model, [HumanMessage(content=prompt)], CLASSIFY_AND_RERANK_SCHEMA,
+                                       "symptom")
+        return parsed["category"], self._pick(candidates, parsed["choice"])
+
+    @staticmethod
+    def _pick(candidates: list, number: int) -> str:
+        choice_index = number - 1
+        if not 0 <= choice_index < len(candidates):
+            raise ValueError("LLM returned an out-of-bounds number.")
+        return candidates[choice_index]
+
+    def _identify(self, symptoms: str):
+        """
+        Runs the hierarchical search. Returns the identified issue and, when the full
+        search succeeded, the result to cache (fallback answers are not cached).
+        """
+        retrieved_docs = []
+        try:
+            # Step 1: Broad candidate retrieval, overlapped with the category call in parallel mode.
+            # The graph entry point may already have started it while the router was deciding.
+            retrieval = prefetcher.claim("symptom_retrieval", symptoms) or _executor.submit(self._retrieve, symptoms)
+            classification = _executor.submit(self._classify, symptoms) if self.mode == "parallel" else None
+
+            retrieved_docs = retrieval.result()
+            if not retrieved_docs:
+                raise ValueError("No relevant documents found in the knowledge base.")
+            candidates = candidate_focus_areas(retrieved_docs)
+
+            # Step 2 + 3: Category and re-ranking
+            if self.mode == "single_call":
+                category, identified_issue = self._classify_and_rerank(symptoms, candidates)
             else:
-                raise ValueError("Could not parse LLM re-rank response.")
+                category = classification.result()
+                identified_issue = self._rerank(symptoms, category, candidates)
+            print(f"---Agent Logic---: Classified symptoms as '{category}'")
+            print(f"---Agent Logic---: Final identified issue: {identified_issue}")
+            return identified_issue, {"health_issue": identified_issue, "category": category,
+                                      "candidates": candidates}
 
         except Exception as e:
             print(f"---Agent Logic---: Hierarchical search failed: {e}. Using simple top result.")
-            retrieved_docs = symptom_kb.retriever.invoke(symptoms)
-            identified_issue = retrieved_docs[0].metadata['focus_area'] if retrieved_docs else "Undetermined"
+            metrics.increment("symptom.fallbacks")
+            # Reuse the first retrieval; only query again if that retrieval itself failed
+            if not retrieved_docs:
+                try:
+                    retrieved_docs = self._retrieve(symptoms)
+                except Exception as retrieval_error:
+                    print(f"---Agent Logic---: Retrieval failed again: {retrieval_error}")
+            identified_issue = candidate_focus_areas(retrieved_docs)[0] if retrieved_docs else "Undetermined"
+
+        return identified_issue, None
+
+    def __call__(self, state: AppState):
+        print("---AGENT 1: Symptom Identifier---")
+
+        symptoms = state['messages'][-1].content
+        user_input = symptoms.lower()
+        if "analyze" in user_input and "symptoms" in user_input:
+            prefetcher.discard("symptom_retrieval", symptoms)
+            return {"messages": [
+                AIMessage(content="Of course. Please describe the symptoms you are experiencing in detail.")]}
+
+        if not symptom_kb.retriever:
+            prefetcher.discard("symptom_retrieval", symptoms)
+            return {
+                "messages": [AIMessage(content="My symptom knowledge base failed to load.")],
+                "health_issue": "ERROR: KB_FAILED_TO_LOAD",
+            }
+
+        print(f"---Agent Logic---: Starting hierarchical search ({self.mode}) for: '{symptoms}'")
+
+        turn_start = time.perf_counter()
+        query_vector = None
+        if self.result_cache.similarity > 0:
+            try:
+                query_vector = symptom_kb.embedding_model.embed_query(symptoms)
+            except Exception as e:
+                print(f"---Agent Logic---: Could not embed symptoms for the result cache: {e}")
+        cached = self.result_cache.get(symptoms, query_vector)
+        if cached:
+            prefetcher.discard("symptom_retrieval", symptoms)
+            identified_issue = cached["health_issue"]
+            print(f"---Agent Logic---: Reusing cached identification: {identified_issue}")
+        else:
+            identified_issue, result = self._identify(symptoms)
+            if result:
+                self.result_cache.put(symptoms, result, query_vector)
+
+        metrics.record_timing("symptom.total", time.perf_counter() - turn_start)
 
         response_text = (
             f"Based on your symptoms, the potential issue is '{identified_issue}'.\n\n"
@@ -139,4 +516,3 @@ class SymptomIdentifierAgent:
             "messages": [AIMessage(content=response_text)],
             "health_issue": identified_issue,
         }
-
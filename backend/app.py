@@ -10,9 +10,13 @@ from dotenv import load_dotenv
 from main import app as langgraph_app
 from database import (
     get_new_session_id, save_chat_state, load_chat_state,
-    get_all_chats, message_to_dict, delete_chat_file
+    get_all_chats, message_to_dict, delete_chat_file, get_session_image_paths
 )
 from langchain_core.messages import HumanMessage
+from embedding_cache import get_embedding_cache
+from metrics import metrics
+from upload_store import UploadStore
+from report_pages import PDF_SUPPORTED
 
 # --- Basic Setup ---
 load_dotenv()
@@ -25,7 +29,11 @@ UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+# PDFs need the optional 'pypdfium2' package (see report_pages.py)
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'} | ({'pdf'} if PDF_SUPPORTED else set())
+# Uploads are stored by content hash and removed once no session points at them
+upload_store = UploadStore(UPLOAD_FOLDER)
+upload_store.collect_garbage(get_session_image_paths())
 
 
 def allowed_file(filename):
@@ -39,7 +47,7 @@ def new_chat_endpoint():
     """Creates a new chat session and returns its ID and a default title."""
     try:
         session_id = get_new_session_id()
-        initial_state = {"messages": [], "health_issue": "", "extracted_text": "", "image_path": ""}
+        initial_state = {"messages": [], "health_issue": "", "extracted_text": "", "image_path": "", "image_paths": []}
         save_chat_state(session_id, initial_state)
         new_chat_info = {"id": session_id, "title": "New Conversation"}
         return jsonify(new_chat_info)
@@ -77,6 +85,7 @@ def delete_chat_endpoint(session_id):
     try:
         success = delete_chat_file(session_id)
         if success:
+            upload_store.collect_garbage(get_session_image_paths())
             return jsonify({"success": True, "message": f"Chat {session_id} deleted"}), 200
         else:
             return jsonify({"success": False, "message": "Chat not found"}), 404
@@ -100,6 +109,7 @@ def chat_endpoint():
 
         current_state['messages'].append(HumanMessage(content=user_message_content))
         current_state['image_path'] = ""  # Clear image path for text messages
+        current_state['image_paths'] = []
 
         result_state = langgraph_app.invoke(current_state)
         save_chat_state(session_id, result_state)
@@ -115,27 +125,31 @@ def chat_endpoint():
 
 @app.route('/upload_report', methods=['POST'])
 def upload_report_endpoint():
-    """Handles medical report image uploads."""
+    """Handles medical report uploads: one image, a PDF, or several photos of the pages of one report."""
     try:
         session_id = request.form.get('session_id')
         if not session_id or 'report_image' not in request.files:
             return jsonify({"error": "Session ID and file are required."}), 400
 
-        file = request.files['report_image']
-        if file.filename == '' or not allowed_file(file.filename):
-            return jsonify({"error": "Invalid file."}), 400
+        files = request.files.getlist('report_image')
+        if any(file.filename == '' or not allowed_file(file.filename) for file in files):
+            return jsonify({"error": f"Invalid file. Allowed types: {', '.join(sorted(ALLOWED_EXTENSIONS))}."}), 400
 
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        filenames = [secure_filename(file.filename) for file in files]
+        filepaths = [upload_store.save_stream(file.stream, file.filename.rsplit('.', 1)[1]) for file in files]
 
         current_state = load_chat_state(session_id)
 
         # --- FIX: Reset state for a clean upload process ---
-        current_state['image_path'] = filepath
+        current_state['image_path'] = filepaths[0]
+        current_state['image_paths'] = filepaths  # Pages in upload order
         current_state['extracted_text'] = ""  # Clear any old extracted text
 
-        current_state['messages'].append(HumanMessage(content=f"User uploaded an image: {filename}"))
+        if len(filenames) == 1:
+            upload_message = f"User uploaded an image: {filenames[0]}"
+        else:
+            upload_message = f"User uploaded a {len(filenames)}-file report: {', '.join(filenames)}"
+        current_state['messages'].append(HumanMessage(content=upload_message))
 
         result_state = langgraph_app.invoke(current_state)
         save_chat_state(session_id, result_state)
@@ -149,6 +163,14 @@ def upload_report_endpoint():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Returns the process-wide counters and per-step timings."""
+    snapshot = metrics.snapshot()
+    snapshot["embedding_cache"] = get_embedding_cache().stats()
+    return jsonify(snapshot)
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
 
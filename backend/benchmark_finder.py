@@ -0,0 +1,82 @@
+# File: benchmark_finder.py
+# Load test for the doctor-finder path: sends concurrent /find_doctors requests to
+# the MCP server and reports throughput, latency percentiles and errors, followed by
+# the server's own Places latency, cache and circuit-breaker metrics.
+# Run it against places_stub.py to measure without network access:
+#   python places_stub.py --latency-ms 150 --latency-sigma 0.6 --error-rate 0.01
+#   PLACES_API_BASE_URL=http://127.0.0.1:5002 GOOGLE_MAPS_API_KEY=stub python mcp_server.py
+# Usage: python benchmark_finder.py --requests 500 --concurrency 16 --distinct 40
+
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from finder_rules import CATEGORY_SPECIALTIES, load_gazetteer
+from http_pool import DEFAULT_TIMEOUT, create_session
+
+
+def make_workload(num_requests: int, distinct: int, seed: int = 0) -> list:
+    """(specialty, location) pairs drawn from a pool of `distinct` pairs, so repeats hit the cache."""
+    rng = random.Random(seed)
+    locations = sorted(set(load_gazetteer().values()))
+    specialties = sorted(set(CATEGORY_SPECIALTIES.values()))
+    pool = [(rng.choice(specialties), rng.choice(locations)) for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(num_requests)]
+
+
+def run_benchmark(url: str, num_requests: int, concurrency: int, distinct: int):
+    workload = make_workload(num_requests, distinct)
+    session = create_session(pool_maxsize=concurrency)
+
+    def one_request(pair):
+        specialty, location = pair
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{url}/find_doctors", json={"specialty": specialty, "location": location},
+                                    timeout=DEFAULT_TIMEOUT)
+            outcome = "ok" if response.ok else f"http_{response.status_code}"
+        except requests.exceptions.RequestException as e:
+            outcome = type(e).__name__
+        return outcome, (time.perf_counter() - start) * 1000
+
+    print(f"--- Sending {num_requests} requests ({distinct} distinct) to {url} with {concurrency} workers ---")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_request, workload))
+    elapsed = time.perf_counter() - start
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    latencies = np.array([latency for _, latency in results])
+    print(f"\n{'throughput':<12}{num_requests / elapsed:>10.1f} req/s")
+    for label, value in (("mean", latencies.mean()), ("p50", np.percentile(latencies, 50)),
+                         ("p95", np.percentile(latencies, 95)), ("p99", np.percentile(latencies, 99)),
+                         ("max", latencies.max())):
+        print(f"{label:<12}{value:>10.1f} ms")
+    print(f"{'outcomes':<12}{dict(outcomes)}")
+
+    try:
+        server_metrics = session.get(f"{url}/metrics", timeout=DEFAULT_TIMEOUT).json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Could not read the server metrics: {e}")
+        return
+    places = server_metrics.get("timings", {}).get("mcp.places_request")
+    if places:
+        print(f"\nPlaces calls: {places['count']}, p50 {places['p50_ms']} ms, p95 {places['p95_ms']} ms")
+    print(f"Places cache: {server_metrics.get('places_cache')}")
+    print(f"Breaker: {server_metrics.get('gauges', {}).get('circuit.places_api.state')}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test the MCP server's /find_doctors endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="Base URL of mcp_server.py.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--distinct", type=int, default=40, help="Distinct (specialty, location) pairs.")
+    args = parser.parse_args()
+
+    run_benchmark(args.url, args.requests, args.concurrency, args.distinct)
@@ -0,0 +1,108 @@
+# File: benchmark_index.py
+# Compares approximate FAISS index types against the exact flat index on the
+# embeddings checkpointed by preprocess.py: recall@k, query latency and memory.
+# Without a query file, stored vectors are sampled as queries; each query's own
+# vector is then dropped from its results, or every index would score a free hit.
+# Usage: python benchmark_index.py --index faiss_index --k 5 --queries 200
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from index_store import INDEX_TYPES, build_faiss_index, read_manifest
+from preprocess import open_checkpoint
+
+
+def load_corpus_vectors(index_path: str, model_name: str) -> np.ndarray:
+    """Reads every checkpointed embedding, i.e. exactly the vectors the index was built from."""
+    checkpoint = open_checkpoint(index_path, model_name)
+    if not len(checkpoint):
+        raise ValueError(f"No checkpointed embeddings found under {index_path}. Run preprocess.py first.")
+    return np.stack([checkpoint.get(content_hash) for content_hash in checkpoint])
+
+
+def load_query_vectors(corpus: np.ndarray, num_queries: int, query_file: str, model_name: str,
+                       seed: int = 0):
+    """
+    Embeds the lines of query_file, or samples stored vectors when no file is given.
+    Returns (queries, the corpus positions of sampled queries or None).
+    """
+    if query_file:
+        from langchain_ollama import OllamaEmbeddings
+        with open(query_file, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        return np.asarray(OllamaEmbeddings(model=model_name).embed_documents(queries), dtype=np.float32), None
+    rng = np.random.RandomState(seed)
+    picks = rng.choice(len(corpus), size=min(num_queries, len(corpus)), replace=False)
+    return np.ascontiguousarray(corpus[picks]), picks
+
+
+def time_queries(index, queries: np.ndarray, k: int, self_ids=None):
+    """
+    Searches one query at a time, like the symptom agent does. Returns (ids, latencies in ms).
+    With self_ids, one extra neighbour is fetched and the query's own corpus entry removed.
+    """
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    fetch = k + 1 if self_ids is not None else k
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), fetch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = found[0]
+        if self_ids is not None:
+            found = found[found != self_ids[i]]
+        ids[i] = found[:k]
+    return ids, np.array(latencies)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run_benchmark(index_path: str, k: int, num_queries: int, index_types: list, query_file: str = None):
+    manifest = read_manifest(index_path)
+    model_name = manifest.get("embedding_model", "nomic-embed-text")
+    corpus = load_corpus_vectors(index_path, model_name)
+    queries, self_ids = load_query_vectors(corpus, num_queries, query_file, model_name)
+    print(f"--- Benchmarking on {len(corpus)} vectors (dim {corpus.shape[1]}), {len(queries)} queries, k={k} ---")
+    if self_ids is not None:
+        print("Queries are sampled from the corpus; each query's own vector is excluded from its results.")
+
+    rows = []
+    truth = None
+    for index_type in ["flat"] + [t for t in index_types if t != "flat"]:
+        start = time.perf_counter()
+        try:
+            index, params = build_faiss_index(corpus, index_type)
+        except ValueError as e:
+            print(f"Skipping {index_type}: {e}")
+            continue
+        build_seconds = time.perf_counter() - start
+
+        ids, latencies = time_queries(index, queries, k, self_ids)
+        if truth is None:
+            truth = ids
+        size_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+        rows.append((index_type, recall_at_k(ids, truth), latencies.mean(), np.percentile(latencies, 95),
+                     size_mb, build_seconds))
+
+    print(f"\n{'index':<10}{'recall@' + str(k):>10}{'mean ms':>10}{'p95 ms':>10}{'size MB':>10}{'build s':>10}")
+    for index_type, recall, mean_ms, p95_ms, size_mb, build_seconds in rows:
+        print(f"{index_type:<10}{recall:>10.3f}{mean_ms:>10.3f}{p95_ms:>10.3f}{size_mb:>10.1f}{build_seconds:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against the exact flat index.")
+    parser.add_argument("--index", default="faiss_index", help="Index folder built by preprocess.py.")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query (the symptom agent uses 5).")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors sampled as queries.")
+    parser.add_argument("--query-file", help="Optional text file with one symptom query per line.")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=[t for t in INDEX_TYPES if t != "flat"],
+                        help="Index types to compare against flat.")
+    args = parser.parse_args()
+
+    run_benchmark(args.index, args.k, args.queries, args.types, args.query_file)
@@ -0,0 +1,139 @@
+# File: bm25_index.py
+# Inverted-index BM25 retriever over the MedQuAD questions, focus areas and answers.
+# preprocess.py builds it next to the FAISS index with the same document ids, so
+# keyword hits (exact disease or drug names the embedding model misses) can be
+# fused with the vector results by SymptomKnowledgeBase.
+#
+# On disk (faiss_index/bm25/): terms.json maps each term to its slice of the
+# postings arrays; postings_docs.npy / postings_tf.npy hold document ids and term
+# frequencies back to back, and doc_lengths.npy the token count of every document.
+# The arrays are memory-mapped at load time.
+
+import json
+import os
+import re
+from array import array
+
+import numpy as np
+
+BM25_DIR_NAME = "bm25"
+TERMS_FILE_NAME = "terms.json"
+POSTINGS_DOCS_FILE_NAME = "postings_docs.npy"
+POSTINGS_TF_FILE_NAME = "postings_tf.npy"
+DOC_LENGTHS_FILE_NAME = "doc_lengths.npy"
+
+# --- BM25 Parameters ---
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from has have how i if in into is it its me my
+not of on or so such than that the their them then there these they this to was we were what when
+where which who why will with you your
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Builder:
+    """
+    Collects postings while the index is built. Text can be added to a document more
+    than once (e.g. the question of a duplicate found in a later chunk); the entries
+    are merged when the index is saved.
+    """
+
+    def __init__(self):
+        self._postings = {}  # term -> (array of doc ids, array of term frequencies)
+        self._doc_lengths = array('I')
+
+    def add(self, doc_id: int, text: str):
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            docs, tfs = self._postings.setdefault(term, (array('I'), array('I')))
+            docs.append(doc_id)
+            tfs.append(tf)
+        if doc_id >= len(self._doc_lengths):
+            self._doc_lengths.extend([0] * (doc_id + 1 - len(self._doc_lengths)))
+        self._doc_lengths[doc_id] += sum(counts.values())
+
+    def save(self, index_path: str) -> int:
+        """Writes the inverted index; returns the vocabulary size."""
+        directory = os.path.join(index_path, BM25_DIR_NAME)
+        os.makedirs(directory, exist_ok=True)
+        terms = {}
+        all_docs, all_tfs = [], []
+        offset = 0
+        for term in sorted(self._postings):
+            docs, tfs = self._postings[term]
+            docs = np.frombuffer(docs, dtype=np.uint32)
+            tfs = np.frombuffer(tfs, dtype=np.uint32)
+            unique_docs, inverse = np.unique(docs, return_inverse=True)
+            merged_tfs = np.bincount(inverse, weights=tfs).astype(np.float32)
+            terms[term] = [offset, len(unique_docs)]
+            all_docs.append(unique_docs.astype(np.uint32))
+            all_tfs.append(merged_tfs)
+            offset += len(unique_docs)
+
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+        arrays = {
+            POSTINGS_DOCS_FILE_NAME: np.concatenate(all_docs) if all_docs else np.zeros(0, dtype=np.uint32),
+            POSTINGS_TF_FILE_NAME: np.concatenate(all_tfs) if all_tfs else np.zeros(0, dtype=np.float32),
+            DOC_LENGTHS_FILE_NAME: doc_lengths,
+        }
+        for name, values in arrays.items():
+            path = os.path.join(directory, name)
+            with open(path + ".tmp", 'wb') as f:
+                np.save(f, values)
+            os.replace(path + ".tmp", path)
+
+        # The term table is written last, so a complete terms.json means a complete index
+        terms_path = os.path.join(directory, TERMS_FILE_NAME)
+        with open(terms_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"k1": BM25_K1, "b": BM25_B, "terms": terms}, f)
+        os.replace(terms_path + ".tmp", terms_path)
+        return len(terms)
+
+
+class BM25Index:
+    def __init__(self, index_path: str):
+        directory = os.path.join(index_path, BM25_DIR_NAME)
+        with open(os.path.join(directory, TERMS_FILE_NAME), 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        self.k1 = table["k1"]
+        self.b = table["b"]
+        self.terms = table["terms"]
+        self.postings_docs = np.load(os.path.join(directory, POSTINGS_DOCS_FILE_NAME), mmap_mode='r')
+        self.postings_tf = np.load(os.path.join(directory, POSTINGS_TF_FILE_NAME), mmap_mode='r')
+        self.doc_lengths = np.load(os.path.join(directory, DOC_LENGTHS_FILE_NAME))
+        self.num_docs = len(self.doc_lengths)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+        # Precomputed once; it is the only per-document part of the BM25 denominator
+        self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_doc_length or 1.0))
+
+    @staticmethod
+    def exists(index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, BM25_DIR_NAME, TERMS_FILE_NAME))
+
+    def search(self, query: str, k: int) -> tuple:
+        """Returns (doc ids, scores) of the k best-scoring documents that contain a query term."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.terms:
+                continue
+            offset, count = self.terms[term]
+            docs = self.postings_docs[offset:offset + count]
+            tfs = self.postings_tf[offset:offset + count]
+            idf = np.log(1 + (self.num_docs - count + 0.5) / (count + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k)[:k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return ranked, scores[ranked]
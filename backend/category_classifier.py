@@ -0,0 +1,128 @@
+# File: category_classifier.py
+# Local body-system classifier for the symptom agent. preprocess.py labels each
+# MedQuAD answer with a category (from a focus_area -> category CSV, or from the
+# keyword table below) and stores one prototype vector per category. At query time
+# the symptom embedding is compared against those prototypes, so the category is
+# known in milliseconds and the LLM is only asked when the match is unsure.
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+PROTOTYPES_FILE_NAME = "category_prototypes.npz"
+
+# --- Labelling ---
+# Matched at word starts against the focus area (weighted) and the answer text
+CATEGORY_KEYWORDS = {
+    "Cardiovascular": ("heart", "cardi", "coronary", "arter", "aort", "aneurysm", "arrhythmi", "angina",
+                       "hypertension", "blood pressure", "vascular", "valve", "vein", "thrombo"),
+    "Neurological": ("brain", "nerve", "neuro", "seizure", "epilep", "migraine", "headache", "stroke",
+                     "dementia", "alzheimer", "parkinson", "spinal cord", "ataxia", "palsy", "cerebral"),
+    "Respiratory": ("lung", "pulmonary", "respirat", "breath", "asthma", "bronch", "pneumon", "airway",
+                    "cough", "trache", "emphysema", "tuberculosis"),
+    "Dermatological": ("skin", "derma", "rash", "eczema", "psoriasis", "acne", "melanoma", "hair", "nail",
+                       "blister", "itch"),
+    "Musculoskeletal": ("bone", "muscle", "muscular", "joint", "arthritis", "osteo", "skeletal", "tendon",
+                        "ligament", "fracture", "myopath", "dystrophy", "scoliosis"),
+    "Gastrointestinal": ("stomach", "intestin", "bowel", "colon", "liver", "hepat", "gastr", "digest",
+                         "esophag", "pancrea", "crohn", "colitis", "celiac", "rectal", "gallbladder"),
+    "General/Systemic": ("fever", "fatigue", "infection", "immune", "sepsis", "anemia", "diabetes", "thyroid",
+                         "metabolic", "lupus", "weight loss", "hormone", "endocrine"),
+}
+FOCUS_AREA_WEIGHT = 3
+MIN_LABEL_SCORE = 3
+
+_KEYWORD_PATTERNS = {
+    category: [re.compile(r"\b" + re.escape(keyword)) for keyword in keywords]
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+# --- Query-time Configuration ---
+# Softmax temperature over cosine similarities; lower makes the confidence sharper
+PROTOTYPE_TEMPERATURE = 0.05
+
+
+def keyword_category(focus_area: str, text: str = ""):
+    """Best-matching category for a document, or None when no category clearly wins."""
+    focus_area, text = focus_area.lower(), text.lower()
+    scores = {}
+    for category, patterns in _KEYWORD_PATTERNS.items():
+        scores[category] = sum(FOCUS_AREA_WEIGHT * bool(p.search(focus_area)) + bool(p.search(text))
+                               for p in patterns)
+    ranked = sorted(scores.values(), reverse=True)
+    best = max(scores, key=scores.get)
+    if ranked[0] < MIN_LABEL_SCORE or ranked[0] == ranked[1]:
+        return None
+    return best
+
+
+def load_category_labels(csv_path: str) -> dict:
+    """Reads a hand-labelled focus_area,category CSV; these labels win over the keyword table."""
+    labels = pd.read_csv(csv_path).dropna(subset=['focus_area', 'category'])
+    unknown = set(labels['category']) - set(CATEGORY_KEYWORDS)
+    if unknown:
+        raise ValueError(f"Unknown categories in {csv_path}: {sorted(unknown)}")
+    return dict(zip(labels['focus_area'], labels['category']))
+
+
+class CategoryPrototypeBuilder:
+    """Averages the embeddings of every labelled answer into one prototype per category."""
+
+    def __init__(self, focus_area_labels: dict = None):
+        self.focus_area_labels = focus_area_labels or {}
+        self._sums = {}
+        self._counts = {}
+
+    def label(self, focus_areas: list, text: str):
+        for focus_area in focus_areas:
+            if focus_area in self.focus_area_labels:
+                return self.focus_area_labels[focus_area]
+        return keyword_category(" ".join(focus_areas), text)
+
+    def add(self, vector: np.ndarray, focus_areas: list, text: str):
+        category = self.label(focus_areas, text)
+        if category is None:
+            return
+        if category not in self._sums:
+            self._sums[category] = np.zeros(len(vector), dtype=np.float64)
+            self._counts[category] = 0
+        self._sums[category] += vector
+        self._counts[category] += 1
+
+    def save(self, index_path: str) -> dict:
+        """Writes the prototypes next to the index; returns the number of answers behind each."""
+        if not self._sums:
+            raise ValueError("No answers could be labelled with a category.")
+        categories = sorted(self._sums)
+        prototypes = np.stack([self._sums[c] / self._counts[c] for c in categories]).astype(np.float32)
+        prototypes /= np.linalg.norm(prototypes, axis=1, keepdims=True)
+        path = os.path.join(index_path, PROTOTYPES_FILE_NAME)
+        with open(path + ".tmp", 'wb') as f:
+            np.savez(f, categories=np.array(categories), prototypes=prototypes,
+                     counts=np.array([self._counts[c] for c in categories]))
+        os.replace(path + ".tmp", path)
+        return {c: self._counts[c] for c in categories}
+
+
+class CategoryClassifier:
+    """Nearest-prototype classifier over cosine similarity."""
+
+    def __init__(self, index_path: str):
+        with np.load(os.path.join(index_path, PROTOTYPES_FILE_NAME)) as data:
+            self.categories = [str(c) for c in data['categories']]
+            self.prototypes = data['prototypes']
+
+    @staticmethod
+    def exists(index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, PROTOTYPES_FILE_NAME))
+
+    def classify(self, query_vector) -> tuple:
+        """Returns (category, confidence), the confidence being the softmax weight of the best prototype."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        similarities = self.prototypes @ query
+        weights = np.exp((similarities - similarities.max()) / PROTOTYPE_TEMPERATURE)
+        best = int(np.argmax(similarities))
+        return self.categories[best], float(weights[best] / weights.sum())
@@ -0,0 +1,80 @@
+# File: centroid_index.py
+# Second, much smaller index holding one centroid vector per focus_area.
+# Symptom lookup first picks the closest focus areas here and then fetches
+# supporting passages only among those areas' documents in the main index.
+
+import json
+import os
+
+import faiss
+import numpy as np
+
+CENTROID_DIR_NAME = "centroids"
+CENTROID_FAISS_FILE_NAME = "centroids.faiss"
+CENTROID_LABELS_FILE_NAME = "focus_areas.json"
+
+
+class FocusAreaCentroidBuilder:
+    """Accumulates running vector sums and document ids per focus area while the index is built."""
+
+    def __init__(self):
+        self._sums = {}
+        self._counts = {}
+        self._members = {}
+
+    def add(self, doc_id: int, vector: np.ndarray, focus_areas: list):
+        for focus_area in dict.fromkeys(focus_areas):
+            members = self._members.setdefault(focus_area, set())
+            if doc_id in members:
+                continue
+            members.add(doc_id)
+            if focus_area not in self._sums:
+                self._sums[focus_area] = np.zeros(len(vector), dtype=np.float64)
+                self._counts[focus_area] = 0
+            self._sums[focus_area] += vector
+            self._counts[focus_area] += 1
+
+    def save(self, index_path: str) -> int:
+        """Writes the centroid index and the per-area member lists; returns the number of areas."""
+        if not self._sums:
+            raise ValueError("No focus areas were recorded for the centroid index.")
+        directory = os.path.join(index_path, CENTROID_DIR_NAME)
+        os.makedirs(directory, exist_ok=True)
+        labels = sorted(self._sums)
+        centroids = np.stack([self._sums[label] / self._counts[label] for label in labels]).astype(np.float32)
+
+        index = faiss.IndexFlatL2(centroids.shape[1])
+        index.add(centroids)
+        faiss_path = os.path.join(directory, CENTROID_FAISS_FILE_NAME)
+        faiss.write_index(index, faiss_path + ".tmp")
+        os.replace(faiss_path + ".tmp", faiss_path)
+
+        labels_path = os.path.join(directory, CENTROID_LABELS_FILE_NAME)
+        with open(labels_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump([{"focus_area": label, "members": sorted(self._members[label])} for label in labels],
+                      f, ensure_ascii=False)
+        os.replace(labels_path + ".tmp", labels_path)
+        return len(labels)
+
+
+class FocusAreaCentroidIndex:
+    """Read side: nearest focus areas for a query vector, and the documents belonging to each."""
+
+    def __init__(self, index_path: str):
+        directory = os.path.join(index_path, CENTROID_DIR_NAME)
+        self.index = faiss.read_index(os.path.join(directory, CENTROID_FAISS_FILE_NAME))
+        with open(os.path.join(directory, CENTROID_LABELS_FILE_NAME), 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        self.focus_areas = [entry["focus_area"] for entry in entries]
+        self._members = {entry["focus_area"]: np.array(entry["members"], dtype=np.int64) for entry in entries}
+
+    @staticmethod
+    def exists(index_path: str) -> bool:
+        return os.path.exists(os.path.join(index_path, CENTROID_DIR_NAME, CENTROID_FAISS_FILE_NAME))
+
+    def nearest_focus_areas(self, query_vector: np.ndarray, n: int) -> list:
+        _, ids = self.index.search(np.asarray(query_vector, dtype=np.float32).reshape(1, -1), n)
+        return [self.focus_areas[i] for i in ids[0] if i >= 0]
+
+    def members(self, focus_area: str) -> np.ndarray:
+        return self._members.get(focus_area, np.zeros(0, dtype=np.int64))
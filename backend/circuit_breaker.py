@@ -0,0 +1,155 @@
+# File: circuit_breaker.py
+# Fail-fast protection for the doctor-finder upstreams (MCP server, Places API).
+# A CircuitBreaker opens after a run of consecutive failures and then rejects calls
+# immediately instead of letting every turn wait out the timeout. After reset_timeout
+# seconds it lets one probe call through (half-open); success closes it again,
+# failure re-opens it. The state is published as the gauge circuit.<name>.state.
+#
+# A HedgedCaller optionally trims tail latency: when a call has not returned after
+# the recent p95 latency, an identical second call is started and whichever
+# succeeds first wins. Only use it for idempotent calls.
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import metrics
+
+# --- Circuit Breaker Configuration ---
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# --- Hedging Configuration ---
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "0") == "1"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "0.95"))
+# Used until HEDGE_MIN_SAMPLES latencies have been seen
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", "2.0"))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT, failure_exceptions: tuple = (Exception,)):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        # Caller holds the lock (or is __init__)
+        self._state = state
+        metrics.set_gauge(f"circuit.{self.name}.state", state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    metrics.increment(f"circuit.{self.name}.rejected")
+                    raise CircuitOpenError(f"The {self.name} circuit is open.")
+                self._set_state(HALF_OPEN)
+                print(f"---Circuit Breaker---: '{self.name}' half-open, sending a probe call.")
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    metrics.increment(f"circuit.{self.name}.rejected")
+                    raise CircuitOpenError(f"The {self.name} circuit is half-open and already probing.")
+                self._probe_in_flight = True
+
+    def _on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+                print(f"---Circuit Breaker---: '{self.name}' closed again.")
+
+    def _on_failure(self):
+        with self._lock:
+            self._failures += 1
+            was_probe = self._probe_in_flight
+            self._probe_in_flight = False
+            if was_probe or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+                metrics.increment(f"circuit.{self.name}.opened")
+                print(f"---Circuit Breaker---: '{self.name}' opened after {self._failures} failure(s).")
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn through the breaker; raises CircuitOpenError without calling it while open."""
+        self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_failure()
+            raise
+        except BaseException:
+            # Not an upstream failure; just free the probe slot
+            with self._lock:
+                self._probe_in_flight = False
+            raise
+        self._on_success()
+        return result
+
+
+class HedgedCaller:
+    def __init__(self, name: str, percentile: float = HEDGE_PERCENTILE,
+                 default_delay: float = HEDGE_DEFAULT_DELAY, max_workers: int = 8):
+        self.name = name
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self._latencies = deque(maxlen=HEDGE_WINDOW)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+
+    def delay(self) -> float:
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return self.default_delay
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def _timed(self, fn, args, kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def call(self, fn, *args, **kwargs):
+        first = self._executor.submit(self._timed, fn, args, kwargs)
+        done, _ = wait([first], timeout=self.delay())
+        if done:
+            return first.result()
+        metrics.increment(f"hedge.{self.name}.hedged")
+        second = self._executor.submit(self._timed, fn, args, kwargs)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is second:
+                    metrics.increment(f"hedge.{self.name}.hedge_wins")
+                return result
+        raise error
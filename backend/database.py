@@ -137,6 +137,22 @@ def get_all_chats():
     return chats
 
 
+def get_session_image_paths() -> dict:
+    """Maps every saved session ID to the upload paths its state points to (image_path and image_paths)."""
+    image_paths = {}
+    if not os.path.exists(CHAT_HISTORY_DIR):
+        return image_paths
+    for file_name in os.listdir(CHAT_HISTORY_DIR):
+        if file_name.endswith('.json'):
+            session_id = file_name[:-len(".json")]
+            chat_data = load_raw_chat_data(session_id)
+            paths = list(chat_data.get("image_paths") or [])
+            if chat_data.get("image_path") and chat_data["image_path"] not in paths:
+                paths.append(chat_data["image_path"])
+            image_paths[session_id] = paths
+    return image_paths
+
+
 def get_chat_history_for_frontend(session_id: str):
     """Gets chat history in format suitable for frontend display."""
     chat_data = load_raw_chat_data(session_id)
@@ -0,0 +1,126 @@
+# File: dedup.py
+# Exact and near-duplicate detection for answer texts, used by preprocess.py
+# so every unique answer is embedded (and indexed) only once.
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# --- Deduplication Configuration ---
+DEDUP_MODES = ("none", "exact", "near")
+# "near" is opt-in: MedQuAD has templated answers (e.g. the GARD entries) that differ only in
+# the disease name, and near mode would index all of them with the first one's text
+DEFAULT_DEDUP_MODE = "exact"
+NEAR_DUPLICATE_THRESHOLD = 0.85
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 32
+SHINGLE_SIZE = 5
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes. With a < 2**31 the
+# product stays below 2**63, so uint64 arithmetic never overflows.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases, strips punctuation and collapses whitespace so trivial edits hash the same."""
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def exact_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class MinHasher:
+    """Computes MinHash signatures over word shingles."""
+
+    def __init__(self, num_perm: int = NUM_PERMUTATIONS, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = normalize_text(text).split()
+        if len(words) < self.shingle_size:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+        return np.array(sorted({zlib.crc32(g.encode("utf-8")) for g in grams}), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class DuplicateDetector:
+    """
+    Maps each text to the key of the first text it duplicates.
+    "exact" compares normalized-text hashes; "near" additionally uses MinHash with
+    LSH banding to find candidates, then confirms them by estimated Jaccard similarity.
+    """
+
+    def __init__(self, mode: str = DEFAULT_DEDUP_MODE, threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                 num_perm: int = NUM_PERMUTATIONS, num_bands: int = NUM_BANDS):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode '{mode}'. Expected one of {DEDUP_MODES}.")
+        if num_perm % num_bands:
+            raise ValueError("num_perm must be a multiple of num_bands.")
+        self.mode = mode
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.rows_per_band = num_perm // num_bands
+        self.hasher = MinHasher(num_perm=num_perm)
+        self._exact: Dict[str, str] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(num_bands)]
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.num_bands):
+            start = band * self.rows_per_band
+            yield band, signature[start:start + self.rows_per_band].tobytes()
+
+    def _find_near(self, signature: np.ndarray) -> Optional[str]:
+        checked = set()
+        for band, band_key in self._band_keys(signature):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= self.threshold:
+                    return candidate
+        return None
+
+    def canonical(self, key: str, text: str) -> str:
+        """Returns the key of the first text this one duplicates, or key itself if it is new."""
+        if self.mode == "none":
+            return key
+
+        text_hash = exact_hash(text)
+        if text_hash in self._exact:
+            self.exact_duplicates += 1
+            return self._exact[text_hash]
+        if self.mode == "exact":
+            self._exact[text_hash] = key
+            return key
+
+        signature = self.hasher.signature(text)
+        match = self._find_near(signature)
+        if match is not None:
+            self.near_duplicates += 1
+            self._exact[text_hash] = match
+            return match
+
+        self._exact[text_hash] = key
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+        return key
@@ -0,0 +1,181 @@
+# File: docstore.py
+# Compact, pickle-free docstore for the symptom FAISS index.
+# Every column is a string arena (<column>.bin, UTF-8 text back to back) plus an
+# offset table (<column>.idx, one uint64 end offset per document). Readers
+# memory-map both files, so worker processes share the same pages and only the
+# documents that are actually returned get decoded.
+
+import json
+import mmap
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_DIR_NAME = "docstore"
+# "metadata" holds any metadata beyond focus_area/question as JSON (e.g. dedup "sources")
+COLUMNS = ("page_content", "focus_area", "question", "metadata")
+TMP_SUFFIX = ".tmp"
+
+
+def _column_paths(directory: str, column: str, suffix: str = ""):
+    return os.path.join(directory, column + ".bin" + suffix), os.path.join(directory, column + ".idx" + suffix)
+
+
+class ArenaColumnWriter:
+    """Appends strings to one column's arena and offset table."""
+
+    def __init__(self, directory: str, column: str, suffix: str = TMP_SUFFIX):
+        self.bin_path, self.idx_path = _column_paths(directory, column, suffix)
+        self._final_paths = _column_paths(directory, column)
+        self._bin = open(self.bin_path, 'wb')
+        self._idx = open(self.idx_path, 'wb')
+        self._end = 0
+
+    def append(self, value: str):
+        data = value.encode("utf-8")
+        self._bin.write(data)
+        self._end += len(data)
+        self._idx.write(np.uint64(self._end).tobytes())
+
+    def close(self):
+        self._bin.close()
+        self._idx.close()
+
+    def commit(self):
+        os.replace(self.bin_path, self._final_paths[0])
+        os.replace(self.idx_path, self._final_paths[1])
+
+    def discard(self):
+        os.remove(self.bin_path)
+        os.remove(self.idx_path)
+
+
+class ArenaColumn:
+    """Read-only, memory-mapped view of one column."""
+
+    def __init__(self, bin_path: str, idx_path: str):
+        if os.path.getsize(idx_path):
+            self._offsets = np.memmap(idx_path, dtype=np.uint64, mode='r')
+        else:
+            self._offsets = np.zeros(0, dtype=np.uint64)
+        self._data = b""
+        if os.path.getsize(bin_path):
+            with open(bin_path, 'rb') as f:
+                # The mapping stays valid after the file object is closed
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def open(cls, directory: str, column: str, suffix: str = ""):
+        return cls(*_column_paths(directory, column, suffix))
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def get(self, i: int) -> str:
+        start = int(self._offsets[i - 1]) if i > 0 else 0
+        return self._data[start:int(self._offsets[i])].decode("utf-8")
+
+
+class ArenaDocstoreWriter:
+    """
+    Writes documents column by column as they arrive; nothing is kept in memory.
+    Files are written under temporary names and swapped in by close().
+    """
+
+    def __init__(self, index_path: str):
+        self.directory = os.path.join(index_path, DOCSTORE_DIR_NAME)
+        os.makedirs(self.directory, exist_ok=True)
+        self._columns = {column: ArenaColumnWriter(self.directory, column) for column in COLUMNS}
+        self.count = 0
+
+    def add(self, text: str, metadata: dict) -> int:
+        extra = {k: v for k, v in metadata.items() if k not in ("focus_area", "question")}
+        self._columns["page_content"].append(text)
+        self._columns["focus_area"].append(str(metadata.get("focus_area", "")))
+        self._columns["question"].append(str(metadata.get("question", "")))
+        self._columns["metadata"].append(json.dumps(extra, ensure_ascii=False) if extra else "")
+        self.count += 1
+        return self.count - 1
+
+    def _merge_extra_sources(self, extra_sources: dict):
+        """Rewrites the metadata column so duplicates found later join their document's "sources"."""
+        focus_areas = ArenaColumn.open(self.directory, "focus_area", TMP_SUFFIX)
+        questions = ArenaColumn.open(self.directory, "question", TMP_SUFFIX)
+        old_metadata = ArenaColumn.open(self.directory, "metadata", TMP_SUFFIX)
+
+        merged = ArenaColumnWriter(self.directory, "metadata", suffix=".merged")
+        for i in range(len(old_metadata)):
+            raw = old_metadata.get(i)
+            if i in extra_sources:
+                extra = json.loads(raw) if raw else {}
+                own_sources = extra.get("sources") or [
+                    {"focus_area": focus_areas.get(i), "question": questions.get(i)}
+                ]
+                extra["sources"] = own_sources + extra_sources[i]
+                raw = json.dumps(extra, ensure_ascii=False)
+            merged.append(raw)
+        merged.close()
+        del old_metadata
+        os.replace(merged.bin_path, self._columns["metadata"].bin_path)
+        os.replace(merged.idx_path, self._columns["metadata"].idx_path)
+
+    def close(self, extra_sources: dict = None):
+        for column in self._columns.values():
+            column.close()
+        if extra_sources:
+            self._merge_extra_sources(extra_sources)
+        for column in self._columns.values():
+            column.commit()
+
+    def discard(self):
+        for column in self._columns.values():
+            column.close()
+            column.discard()
+
+
+class MmapDocstore(Docstore):
+    """LangChain docstore backed by the memory-mapped arenas; documents are decoded on lookup."""
+
+    def __init__(self, index_path: str):
+        directory = os.path.join(index_path, DOCSTORE_DIR_NAME)
+        self._columns = {column: ArenaColumn.open(directory, column) for column in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self._columns["page_content"])
+
+    def focus_area(self, i: int) -> str:
+        return self._columns["focus_area"].get(i)
+
+    def get(self, i: int) -> Document:
+        metadata = {"focus_area": self._columns["focus_area"].get(i), "question": self._columns["question"].get(i)}
+        extra = self._columns["metadata"].get(i)
+        if extra:
+            metadata.update(json.loads(extra))
+        return Document(page_content=self._columns["page_content"].get(i), metadata=metadata)
+
+    def search(self, search: str):
+        i = int(search)
+        if not 0 <= i < len(self):
+            return f"ID {search} not found."
+        return self.get(i)
+
+
+class DocstoreIdMap(Mapping):
+    """index_to_docstore_id for an arena docstore: FAISS row i is document i, so no dict is built."""
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._size:
+            raise KeyError(i)
+        return str(i)
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
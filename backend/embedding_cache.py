@@ -0,0 +1,142 @@
+# File: embedding_cache.py
+# Process-wide cache of query embeddings, shared by every retrieval path.
+# Entries are keyed on (model name, normalized text), evicted LRU-first once the
+# in-memory budget is exceeded, and optionally backed by an on-disk SQLite tier.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from metrics import metrics
+
+# --- Cache Configuration ---
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Set to a file path (e.g. "embedding_cache.sqlite") to keep embeddings across restarts
+EMBEDDING_CACHE_DB = os.environ.get("EMBEDDING_CACHE_DB", "")
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, db_path: str = EMBEDDING_CACHE_DB):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _store(self, key: str, vector: np.ndarray):
+        # Caller holds the lock
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = vector
+        self._bytes += vector.nbytes + len(key)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_vector = self._entries.popitem(last=False)
+            self._bytes -= old_vector.nbytes + len(old_key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.increment("embedding_cache.hits")
+                return vector
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._store(key, vector)
+                    self.disk_hits += 1
+                    metrics.increment("embedding_cache.disk_hits")
+                    return vector
+            self.misses += 1
+            metrics.increment("embedding_cache.misses")
+            return None
+
+    def put(self, key: str, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._store(key, vector)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                                 (key, vector.tobytes()))
+                self._db.commit()
+            metrics.set_gauge("embedding_cache.bytes", self._bytes)
+        return vector
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model so repeated texts are embedded only once per process."""
+
+    def __init__(self, embedding_model: Embeddings, model_name: str, cache: EmbeddingCache = None):
+        self.embedding_model = embedding_model
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model_name, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.cache.put(key, self.embedding_model.embed_query(text))
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self.embedding_model.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = self.cache.put(keys[i], vector)
+        return [vector.tolist() for vector in vectors]
+
+
+# --- Global Instance ---
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+        return _embedding_cache
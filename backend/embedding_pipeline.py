@@ -0,0 +1,119 @@
+# File: embedding_pipeline.py
+# Batched, concurrent embedding stage used by preprocess.py.
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+# --- Pipeline Configuration (overridable from the environment) ---
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.environ.get("EMBED_RETRY_BACKOFF", "1.0"))
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+
+class ThroughputReporter:
+    """Prints docs/sec and an ETA while the pipeline runs."""
+
+    def __init__(self, total: Optional[int], interval: float = PROGRESS_INTERVAL_SECONDS):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started_at = time.perf_counter()
+        self._last_report = 0.0
+        self._last_reported_done = -1
+
+    def update(self, count: int, force: bool = False):
+        self.done += count
+        now = time.perf_counter()
+        if self.done == self._last_reported_done or (not force and now - self._last_report < self.interval):
+            return
+        self._last_report = now
+        self._last_reported_done = self.done
+        elapsed = max(now - self.started_at, 1e-9)
+        rate = self.done / elapsed
+        if self.total:
+            remaining = max(self.total - self.done, 0)
+            eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+            print(f"---Embedding Pipeline---: {self.done}/{self.total} docs | {rate:.1f} docs/sec | ETA {eta}")
+        else:
+            print(f"---Embedding Pipeline---: {self.done} docs | {rate:.1f} docs/sec")
+
+
+class EmbeddingPipeline:
+    """
+    Splits documents into fixed-size batches and keeps a bounded number of
+    embed requests in flight against the embedding server. Failed batches are
+    retried with exponential backoff; a batch that keeps failing aborts the run.
+    """
+
+    def __init__(self, embedding_model: Embeddings, batch_size: int = EMBED_BATCH_SIZE,
+                 max_workers: int = EMBED_CONCURRENCY, max_retries: int = EMBED_MAX_RETRIES,
+                 retry_backoff: float = EMBED_RETRY_BACKOFF):
+        self.embedding_model = embedding_model
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embedding_model.embed_documents(texts)
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"---Embedding Pipeline---: Batch of {len(texts)} failed ({e}). "
+                      f"Retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                time.sleep(delay)
+
+    def _batches(self, items: Iterable[Tuple[str, str]]):
+        keys, texts = [], []
+        for key, text in items:
+            keys.append(key)
+            texts.append(text)
+            if len(keys) == self.batch_size:
+                yield keys, texts
+                keys, texts = [], []
+        if keys:
+            yield keys, texts
+
+    def run(self, items: Iterable[Tuple[str, str]], on_batch: Callable[[List[str], List[List[float]]], None],
+            total: Optional[int] = None) -> int:
+        """
+        Embeds (key, text) pairs and hands every finished batch to on_batch(keys, vectors).
+        on_batch always runs on the calling thread, so it may write to non thread-safe stores.
+        Returns the number of documents embedded.
+        """
+        reporter = ThroughputReporter(total)
+        in_flight = {}
+        batches = self._batches(items)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def fill():
+                # Keep at most two batches per worker queued so the input is never fully materialized
+                while len(in_flight) < self.max_workers * 2:
+                    batch = next(batches, None)
+                    if batch is None:
+                        return
+                    keys, texts = batch
+                    in_flight[executor.submit(self._embed_batch, texts)] = keys
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    keys = in_flight.pop(future)
+                    on_batch(keys, future.result())
+                    reporter.update(len(keys))
+                fill()
+
+        reporter.update(0, force=True)
+        return reporter.done
@@ -0,0 +1,182 @@
+# File: finder_rules.py
+# Rule-based specialty and location extraction for the doctor finder.
+# The location comes from a gazetteer of cities and regions found in the last user
+# message; the specialty from a named specialty in that message, or else from the
+# identified health issue (a MedQuAD focus area) via keyword rules and the body-system
+# categories of category_classifier.py. The finder only asks the LLM when no
+# location is found.
+#
+# The gazetteer can be extended with a JSON file named by FINDER_GAZETTEER_FILE,
+# mapping the name as users write it to the location sent to the Places search,
+# e.g. {"indore": "Indore, Madhya Pradesh, India"}.
+
+import json
+import os
+import re
+
+from category_classifier import keyword_category
+
+FINDER_GAZETTEER_FILE = os.environ.get("FINDER_GAZETTEER_FILE", "")
+DEFAULT_SPECIALTY = "General Physician"
+
+# --- Gazetteer ---
+_INDIAN_CITIES = {
+    "Mumbai": "Maharashtra", "Pune": "Maharashtra", "Nagpur": "Maharashtra", "Nashik": "Maharashtra",
+    "Aurangabad": "Maharashtra", "Thane": "Maharashtra", "Navi Mumbai": "Maharashtra",
+    "Delhi": "Delhi", "New Delhi": "Delhi", "Noida": "Uttar Pradesh", "Gurgaon": "Haryana", "Gurugram": "Haryana",
+    "Faridabad": "Haryana", "Ghaziabad": "Uttar Pradesh", "Lucknow": "Uttar Pradesh", "Kanpur": "Uttar Pradesh",
+    "Agra": "Uttar Pradesh", "Varanasi": "Uttar Pradesh", "Prayagraj": "Uttar Pradesh", "Meerut": "Uttar Pradesh",
+    "Bhopal": "Madhya Pradesh", "Indore": "Madhya Pradesh", "Jabalpur": "Madhya Pradesh", "Gwalior": "Madhya Pradesh",
+    "Ujjain": "Madhya Pradesh", "Raipur": "Chhattisgarh", "Bilaspur": "Chhattisgarh",
+    "Bengaluru": "Karnataka", "Mysuru": "Karnataka", "Mangaluru": "Karnataka", "Hubli": "Karnataka",
+    "Chennai": "Tamil Nadu", "Coimbatore": "Tamil Nadu", "Madurai": "Tamil Nadu", "Tiruchirappalli": "Tamil Nadu",
+    "Hyderabad": "Telangana", "Warangal": "Telangana", "Visakhapatnam": "Andhra Pradesh",
+    "Vijayawada": "Andhra Pradesh", "Tirupati": "Andhra Pradesh", "Kochi": "Kerala",
+    "Thiruvananthapuram": "Kerala", "Kozhikode": "Kerala", "Kolkata": "West Bengal", "Howrah": "West Bengal",
+    "Siliguri": "West Bengal", "Ahmedabad": "Gujarat", "Surat": "Gujarat", "Vadodara": "Gujarat",
+    "Rajkot": "Gujarat", "Gandhinagar": "Gujarat", "Jaipur": "Rajasthan", "Jodhpur": "Rajasthan",
+    "Udaipur": "Rajasthan", "Kota": "Rajasthan", "Ajmer": "Rajasthan", "Chandigarh": "Chandigarh",
+    "Ludhiana": "Punjab", "Amritsar": "Punjab", "Jalandhar": "Punjab", "Dehradun": "Uttarakhand",
+    "Shimla": "Himachal Pradesh", "Srinagar": "Jammu and Kashmir", "Jammu": "Jammu and Kashmir",
+    "Patna": "Bihar", "Gaya": "Bihar", "Ranchi": "Jharkhand", "Jamshedpur": "Jharkhand",
+    "Bhubaneswar": "Odisha", "Cuttack": "Odisha", "Guwahati": "Assam", "Shillong": "Meghalaya",
+    "Panaji": "Goa", "Puducherry": "Puducherry",
+}
+_OTHER_CITIES = {
+    "London": "United Kingdom", "Manchester": "United Kingdom", "New York": "USA", "Los Angeles": "USA",
+    "Chicago": "USA", "San Francisco": "USA", "Boston": "USA", "Toronto": "Canada", "Sydney": "Australia",
+    "Melbourne": "Australia", "Singapore": "Singapore", "Dubai": "United Arab Emirates",
+    "Dhaka": "Bangladesh", "Kathmandu": "Nepal", "Colombo": "Sri Lanka",
+}
+# Older or common alternative names
+_ALIASES = {
+    "bombay": "Mumbai", "bangalore": "Bengaluru", "mysore": "Mysuru", "mangalore": "Mangaluru",
+    "madras": "Chennai", "calcutta": "Kolkata", "trivandrum": "Thiruvananthapuram", "cochin": "Kochi",
+    "ernakulam": "Kochi", "calicut": "Kozhikode", "baroda": "Vadodara", "allahabad": "Prayagraj",
+    "banaras": "Varanasi", "benares": "Varanasi", "vizag": "Visakhapatnam", "trichy": "Tiruchirappalli",
+    "poona": "Pune", "pondicherry": "Puducherry", "panjim": "Panaji", "nyc": "New York",
+}
+# Place names that are also common (Hindi) words, e.g. "sar dard ho gaya"; they only count
+# as a location after a cue such as "in Gaya" or "near Surat"
+AMBIGUOUS_PLACE_NAMES = {"gaya", "surat", "thane", "kota", "dhaka"}
+_LOCATION_CUE = re.compile(r"\b(?:in|near|at|from|around)\s+$", re.IGNORECASE)
+
+
+def load_gazetteer(path: str = FINDER_GAZETTEER_FILE) -> dict:
+    """Lower-cased place name -> location string for the Places search."""
+    gazetteer = {}
+    for city, state in _INDIAN_CITIES.items():
+        gazetteer[city.lower()] = f"{city}, {state}, India"
+    for city, country in _OTHER_CITIES.items():
+        gazetteer[city.lower()] = f"{city}, {country}"
+    for alias, city in _ALIASES.items():
+        gazetteer[alias] = gazetteer[city.lower()]
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            gazetteer.update({name.lower(): location for name, location in json.load(f).items()})
+    return gazetteer
+
+
+# --- Specialties ---
+# Specialties users ask for by name, with the words that name them
+SPECIALTY_NAMES = {
+    "Cardiologist": ("cardiologist", "cardiology", "heart specialist", "heart doctor"),
+    "Neurologist": ("neurologist", "neurology", "brain specialist"),
+    "Pulmonologist": ("pulmonologist", "pulmonology", "chest specialist", "lung specialist"),
+    "Dermatologist": ("dermatologist", "dermatology", "skin specialist", "skin doctor"),
+    "Orthopedist": ("orthopedist", "orthopaedist", "orthopedic", "orthopaedic", "bone specialist"),
+    "Gastroenterologist": ("gastroenterologist", "gastroenterology"),
+    "Endocrinologist": ("endocrinologist", "endocrinology", "diabetologist"),
+    "Ophthalmologist": ("ophthalmologist", "ophthalmology", "eye specialist", "eye doctor"),
+    "ENT Specialist": ("ent", "otolaryngologist", "ear nose throat"),
+    "Nephrologist": ("nephrologist", "nephrology", "kidney specialist"),
+    "Urologist": ("urologist", "urology"),
+    "Gynecologist": ("gynecologist", "gynaecologist", "gynecology", "gynaecology", "obstetrician"),
+    "Oncologist": ("oncologist", "oncology", "cancer specialist"),
+    "Psychiatrist": ("psychiatrist", "psychiatry"),
+    "Pediatrician": ("pediatrician", "paediatrician", "pediatrics", "child specialist"),
+    "Dentist": ("dentist", "dental"),
+    "General Physician": ("general physician", "gp", "family doctor", "general practitioner"),
+}
+# Health issues that need a narrower specialist than their body-system category
+SPECIALTY_KEYWORDS = {
+    "Ophthalmologist": ("eye", "glaucoma", "cataract", "retin", "macular", "cornea", "vision", "blind", "optic"),
+    "ENT Specialist": ("ear infection", "earache", "otitis", "hearing", "deaf", "sinus", "tonsil", "laryn",
+                       "vertigo", "tinnitus", "throat"),
+    "Nephrologist": ("kidney", "renal", "nephr", "dialysis"),
+    "Urologist": ("bladder", "urinary", "prostat", "incontinence", "urethr"),
+    "Gynecologist": ("pregnan", "uter", "ovar", "cervical cancer", "menstru", "menopause", "endometri", "vagin"),
+    "Oncologist": ("cancer", "tumor", "tumour", "carcinoma", "lymphoma", "leukemia", "sarcoma", "myeloma", "neoplas"),
+    "Psychiatrist": ("depress", "anxiety", "schizophren", "bipolar", "mental", "panic", "obsessive", "psych"),
+    "Endocrinologist": ("diabetes", "thyroid", "hormone", "endocrine", "adrenal", "pituitar", "insulin"),
+    "Dentist": ("tooth", "teeth", "gum disease", "dental"),
+}
+CATEGORY_SPECIALTIES = {
+    "Cardiovascular": "Cardiologist",
+    "Neurological": "Neurologist",
+    "Respiratory": "Pulmonologist",
+    "Dermatological": "Dermatologist",
+    "Musculoskeletal": "Orthopedist",
+    "Gastrointestinal": "Gastroenterologist",
+    "General/Systemic": "General Physician",
+}
+
+
+def _word_patterns(table: dict, prefix_only: bool) -> dict:
+    end = "" if prefix_only else r"\b"
+    return {name: [re.compile(r"\b" + re.escape(word) + end, re.IGNORECASE) for word in words]
+            for name, words in table.items()}
+
+
+_SPECIALTY_NAME_PATTERNS = _word_patterns(SPECIALTY_NAMES, prefix_only=False)
+_SPECIALTY_KEYWORD_PATTERNS = _word_patterns(SPECIALTY_KEYWORDS, prefix_only=True)
+
+
+class FinderRules:
+    def __init__(self, gazetteer: dict = None):
+        self.gazetteer = gazetteer or load_gazetteer()
+        # Longest names first, so "New Delhi" wins over "Delhi" and "Navi Mumbai" over "Mumbai"
+        names = sorted(self.gazetteer, key=len, reverse=True)
+        self._location_pattern = re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b",
+                                            re.IGNORECASE)
+
+    def find_location(self, text: str):
+        for match in self._location_pattern.finditer(text):
+            name = match.group(1).lower()
+            if name in AMBIGUOUS_PLACE_NAMES and not _LOCATION_CUE.search(text, 0, match.start()):
+                continue
+            return self.gazetteer[name]
+        return None
+
+    @staticmethod
+    def named_specialty(text: str):
+        """A specialty the user asked for by name, e.g. "find a dermatologist"."""
+        for specialty, patterns in _SPECIALTY_NAME_PATTERNS.items():
+            if any(p.search(text) for p in patterns):
+                return specialty
+        return None
+
+    @staticmethod
+    def specialty_for_issue(health_issue: str):
+        """Maps a MedQuAD focus area such as "Glaucoma" or "Heart Attack" to a specialty."""
+        if not health_issue:
+            return None
+        scores = {specialty: sum(bool(p.search(health_issue)) for p in patterns)
+                  for specialty, patterns in _SPECIALTY_KEYWORD_PATTERNS.items()}
+        best = max(scores, key=scores.get)
+        if scores[best]:
+            return best
+        # Otherwise the specialist for its body system
+        return CATEGORY_SPECIALTIES.get(keyword_category(health_issue))
+
+    def extract(self, last_message: str, health_issue: str = ""):
+        """
+        Returns (specialty, location) when the message names a known place, else None.
+        The specialty falls back to the health issue itself, then to a general physician.
+        """
+        location = self.find_location(last_message)
+        if location is None:
+            return None
+        specialty = (self.named_specialty(last_message) or self.specialty_for_issue(health_issue)
+                     or health_issue or DEFAULT_SPECIALTY)
+        return specialty, location
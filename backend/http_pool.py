@@ -0,0 +1,29 @@
+# File: http_pool.py
+# Pooled HTTP sessions for the doctor-finder hops (agent -> MCP server -> Places API).
+# A requests.Session keeps its TCP/TLS connections alive between calls, so only the
+# first lookup pays for the handshake. Every call gets a (connect, read) timeout so a
+# hung upstream cannot block a worker forever.
+
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- HTTP Pool Configuration ---
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "15"))
+# Number of hosts with a cached pool, and connections kept per host
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def create_session(pool_connections: int = HTTP_POOL_CONNECTIONS,
+                   pool_maxsize: int = HTTP_POOL_MAXSIZE) -> requests.Session:
+    """A keep-alive session; pool_block=False lets bursts open extra, unpooled connections instead of waiting."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=False)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -0,0 +1,110 @@
+# File: image_preprocess.py
+# Shrinks uploaded report images before they are sent to the vision model.
+# Phone photos are often 12+ megapixels; OCR needs far less. The normalizer fixes
+# the EXIF orientation, crops the empty margins, converts to grayscale, caps the
+# longest side and re-encodes with a lossy format instead of a full-size PNG.
+
+import io
+import os
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+# --- Normalization Settings ---
+OCR_NORMALIZE = os.environ.get("OCR_NORMALIZE", "1") == "1"
+OCR_MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", "2000"))
+OCR_GRAYSCALE = os.environ.get("OCR_GRAYSCALE", "1") == "1"
+OCR_CROP_BORDERS = os.environ.get("OCR_CROP_BORDERS", "1") == "1"
+OCR_IMAGE_FORMAT = os.environ.get("OCR_IMAGE_FORMAT", "JPEG").upper()  # JPEG, WEBP or PNG
+OCR_IMAGE_QUALITY = int(os.environ.get("OCR_IMAGE_QUALITY", "85"))
+
+# A pixel counts as content when it differs from the background by more than this (0-255)
+CROP_THRESHOLD = 40
+CROP_MARGIN = 16
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class NormalizedImage:
+    data: bytes
+    mime_type: str
+    original_size: tuple
+    final_size: tuple
+    # True when these are the uploaded file's own bytes
+    is_original: bool = False
+
+
+class ImageNormalizer:
+    def __init__(self, max_side: int = OCR_MAX_SIDE, grayscale: bool = OCR_GRAYSCALE,
+                 crop_borders: bool = OCR_CROP_BORDERS, image_format: str = OCR_IMAGE_FORMAT,
+                 quality: int = OCR_IMAGE_QUALITY):
+        if image_format not in MIME_TYPES:
+            raise ValueError(f"Unsupported OCR image format '{image_format}'. Expected one of {list(MIME_TYPES)}.")
+        self.max_side = max_side
+        self.grayscale = grayscale
+        self.crop_borders = crop_borders
+        self.image_format = image_format
+        self.quality = quality
+
+    @staticmethod
+    def _crop_to_content(img: Image.Image) -> Image.Image:
+        """Crops uniform margins (the page background around a scan or photo of a report)."""
+        gray = img.convert("L")
+        # The corners are almost always background
+        corners = [gray.getpixel(p) for p in ((0, 0), (gray.width - 1, 0), (0, gray.height - 1),
+                                              (gray.width - 1, gray.height - 1))]
+        background = sorted(corners)[len(corners) // 2]
+        mask = gray.point(lambda p: 255 if abs(p - background) > CROP_THRESHOLD else 0)
+        bbox = mask.getbbox()
+        if not bbox:
+            return img
+        left, top, right, bottom = bbox
+        return img.crop((max(0, left - CROP_MARGIN), max(0, top - CROP_MARGIN),
+                         min(img.width, right + CROP_MARGIN), min(img.height, bottom + CROP_MARGIN)))
+
+    def normalize(self, img: Image.Image) -> NormalizedImage:
+        original_size = img.size
+        img = ImageOps.exif_transpose(img)
+        if self.crop_borders:
+            img = self._crop_to_content(img)
+        if self.grayscale:
+            img = img.convert("L")
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        if max(img.size) > self.max_side:
+            img.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        if self.image_format == "PNG":
+            img.save(buffer, format="PNG", optimize=True)
+        else:
+            img.save(buffer, format=self.image_format, quality=self.quality)
+        return NormalizedImage(buffer.getvalue(), MIME_TYPES[self.image_format], original_size, img.size)
+
+
+def encode_lossless(img: Image.Image) -> NormalizedImage:
+    """The original behaviour: the full-resolution image as an RGB PNG."""
+    buffer = io.BytesIO()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.save(buffer, format="PNG")
+    return NormalizedImage(buffer.getvalue(), "image/png", img.size, img.size)
+
+
+def original_if_smaller(image: NormalizedImage, page: Image.Image) -> NormalizedImage:
+    """
+    The uploaded file itself when it is smaller than its normalized encoding, e.g. a small,
+    already compressed screenshot. PDF pages (no file of their own), formats without a
+    MIME type here and photos that still need their EXIF rotation keep the normalized image.
+    """
+    path = page.info.get("source_path")
+    mime_type = MIME_TYPES.get(page.info.get("source_format"))
+    if not path or not mime_type or page.info.get("source_bytes", 0) >= len(image.data):
+        return image
+    if page.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        return image
+    with open(path, 'rb') as f:
+        data = f.read()
+    return NormalizedImage(data, mime_type, page.size, page.size, is_original=True)
@@ -0,0 +1,230 @@
+# File: index_store.py
+# On-disk layout of the symptom FAISS index: the build manifest, the index
+# writer used by preprocess.py and the loader used by SymptomKnowledgeBase.
+
+import json
+import os
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from docstore import ArenaDocstoreWriter, DocstoreIdMap, MmapDocstore
+
+MANIFEST_FILE_NAME = "manifest.json"
+FAISS_FILE_NAME = "index.faiss"
+PICKLE_DOCSTORE_FILE_NAME = "index.pkl"
+EXTRA_SOURCES_FILE_NAME = "extra_sources.jsonl"
+
+# Value of the manifest's "docstore" key for the memory-mapped arena format (see docstore.py)
+DOCSTORE_ARENA = "arena"
+
+# --- Index Types ---
+# "flat" is exact search; the others trade some recall for speed and memory.
+INDEX_TYPES = ("flat", "hnsw", "ivf-flat", "ivf-pq")
+DEFAULT_INDEX_TYPE = "flat"
+DEFAULT_INDEX_PARAMS = {
+    "hnsw_m": 32,           # graph neighbours per node
+    "ef_construction": 200,
+    "ef_search": 64,
+    "nlist": 256,           # IVF cells; clamped so every cell gets enough training points
+    "nprobe": 16,           # IVF cells visited per query
+    "pq_m": 16,             # PQ sub-quantizers; must divide the embedding dimension
+    "pq_nbits": 8,
+    "train_size": 10000,    # vectors buffered to train IVF indexes in streaming builds
+}
+MIN_POINTS_PER_CELL = 39
+
+
+def resolve_index_params(index_type: str, num_vectors: int, dimension: int, overrides: dict = None) -> dict:
+    """Fills in defaults and adapts the IVF/PQ parameters to the amount of training data."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+    params = dict(DEFAULT_INDEX_PARAMS)
+    params.update(overrides or {})
+    if index_type.startswith("ivf"):
+        params["nlist"] = max(1, min(params["nlist"], num_vectors // MIN_POINTS_PER_CELL))
+        params["nprobe"] = min(params["nprobe"], params["nlist"])
+    if index_type == "ivf-pq":
+        if dimension % params["pq_m"]:
+            raise ValueError(f"pq_m={params['pq_m']} does not divide the embedding dimension {dimension}.")
+        if num_vectors < 2 ** params["pq_nbits"]:
+            raise ValueError(f"IVF-PQ with {params['pq_nbits']}-bit codes needs at least "
+                             f"{2 ** params['pq_nbits']} training vectors, got {num_vectors}.")
+    return params
+
+
+def create_faiss_index(index_type: str, dimension: int, params: dict):
+    """Creates an empty (and, for IVF types, untrained) L2 index of the requested type."""
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        return index
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == "ivf-flat":
+        return faiss.IndexIVFFlat(quantizer, dimension, params["nlist"])
+    return faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"], params["pq_nbits"])
+
+
+def apply_search_params(index, index_type: str, params: dict):
+    """Sets the query-time knobs (efSearch / nprobe) that faiss does not persist on disk."""
+    if index_type == "hnsw":
+        index.hnsw.efSearch = int(os.environ.get("FAISS_EF_SEARCH", params.get("ef_search", 64)))
+    elif index_type in ("ivf-flat", "ivf-pq"):
+        faiss.extract_index_ivf(index).nprobe = int(os.environ.get("FAISS_NPROBE", params.get("nprobe", 16)))
+
+
+def restricted_search(index, query_vector: np.ndarray, k: int, allowed_ids: np.ndarray):
+    """Searches only among allowed_ids, keeping the index's own efSearch/nprobe settings."""
+    selector = faiss.IDSelectorBatch(np.asarray(allowed_ids, dtype=np.int64))
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    elif faiss.try_extract_index_ivf(index) is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(np.asarray(query_vector, dtype=np.float32).reshape(1, -1), k, params=params)
+
+
+def build_faiss_index(vectors: np.ndarray, index_type: str = DEFAULT_INDEX_TYPE, overrides: dict = None):
+    """Builds and fills an index from an in-memory matrix. Returns (index, effective params)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    params = resolve_index_params(index_type, len(vectors), vectors.shape[1], overrides)
+    index = create_faiss_index(index_type, vectors.shape[1], params)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index, index_type, params)
+    return index, params
+
+
+def read_manifest(index_path: str) -> dict:
+    """Reads the build manifest written next to the FAISS index, if there is one."""
+    manifest_path = os.path.join(index_path, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Error reading build manifest at {manifest_path}: {e}")
+        return {}
+
+
+def write_manifest(index_path: str, manifest: dict):
+    """Atomically writes the build manifest so readers never see a half-written file."""
+    manifest_path = os.path.join(index_path, MANIFEST_FILE_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, manifest_path)
+
+
+class IndexWriter:
+    """
+    Adds vectors to a FAISS index and writes the matching documents to the arena
+    docstore as they arrive, so the builder never holds the whole corpus.
+    Duplicates found after their answer was written are appended to a side file and
+    folded into the documents' "sources" by close(). All files are written under
+    temporary names and only swapped in by close().
+    IVF indexes need training before vectors can be added, so the first train_size
+    vectors are buffered, used for training and then flushed into the index.
+    """
+
+    def __init__(self, index_path: str, index_type: str = DEFAULT_INDEX_TYPE, index_params: dict = None):
+        self.index_path = index_path
+        os.makedirs(index_path, exist_ok=True)
+        self.index_type = index_type
+        self.index_params = dict(DEFAULT_INDEX_PARAMS)
+        self.index_params.update(index_params or {})
+        self.index = None
+        self._training_buffer = []
+        self._buffered = 0
+        self._docstore = ArenaDocstoreWriter(index_path)
+        self._sources_tmp = os.path.join(index_path, EXTRA_SOURCES_FILE_NAME + ".tmp")
+        self._sources_file = open(self._sources_tmp, 'w', encoding='utf-8')
+
+    @property
+    def count(self) -> int:
+        return self._docstore.count
+
+    def add(self, vectors: np.ndarray, texts: list, metadatas: list) -> list:
+        """Adds one chunk and returns the document ids assigned to it."""
+        self._add_vectors(np.ascontiguousarray(vectors, dtype=np.float32))
+        return [self._docstore.add(text, metadata) for text, metadata in zip(texts, metadatas)]
+
+    def _add_vectors(self, vectors: np.ndarray):
+        if self.index is not None:
+            self.index.add(vectors)
+        elif not self.index_type.startswith("ivf"):
+            self.index_params = resolve_index_params(self.index_type, len(vectors), vectors.shape[1],
+                                                     self.index_params)
+            self.index = create_faiss_index(self.index_type, vectors.shape[1], self.index_params)
+            self.index.add(vectors)
+        else:
+            self._training_buffer.append(vectors)
+            self._buffered += len(vectors)
+            if self._buffered >= self.index_params["train_size"]:
+                self._train_and_flush()
+
+    def _train_and_flush(self):
+        training_vectors = np.concatenate(self._training_buffer)
+        self._training_buffer, self._buffered = [], 0
+        self.index_params = resolve_index_params(self.index_type, len(training_vectors),
+                                                 training_vectors.shape[1], self.index_params)
+        print(f"---Index Writer---: Training {self.index_type} index on {len(training_vectors)} vectors...")
+        self.index = create_faiss_index(self.index_type, training_vectors.shape[1], self.index_params)
+        self.index.train(training_vectors)
+        self.index.add(training_vectors)
+
+    def add_source(self, doc_id: int, source: dict):
+        """Records another CSV row whose answer duplicates an already written document."""
+        self._sources_file.write(json.dumps({"id": doc_id, "source": source}, ensure_ascii=False) + "\n")
+
+    def _read_extra_sources(self) -> dict:
+        extra_sources = {}
+        with open(self._sources_tmp, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                extra_sources.setdefault(entry["id"], []).append(entry["source"])
+        return extra_sources
+
+    def close(self):
+        self._sources_file.close()
+        if self.index is None and self._training_buffer:
+            self._train_and_flush()
+        if self.index is None:
+            self._docstore.discard()
+            os.remove(self._sources_tmp)
+            raise ValueError("No documents were added to the index.")
+        self._docstore.close(self._read_extra_sources())
+        os.remove(self._sources_tmp)
+        faiss_tmp = os.path.join(self.index_path, FAISS_FILE_NAME + ".tmp")
+        faiss.write_index(self.index, faiss_tmp)
+        os.replace(faiss_tmp, os.path.join(self.index_path, FAISS_FILE_NAME))
+        # A pickled docstore from an earlier LangChain build no longer matches this index
+        stale_pickle = os.path.join(self.index_path, PICKLE_DOCSTORE_FILE_NAME)
+        if os.path.exists(stale_pickle):
+            os.remove(stale_pickle)
+
+
+def load_vector_store(index_path: str, embedding_model: Embeddings) -> FAISS:
+    """
+    Loads the symptom index in whichever docstore format the manifest says was built.
+    faiss.read_index restores any index type; only the query-time parameters are reapplied.
+    Arena docstores are memory-mapped instead of unpickled into every process.
+    """
+    manifest = read_manifest(index_path)
+    index_type = manifest.get("index_type", DEFAULT_INDEX_TYPE)
+    if manifest.get("docstore") != DOCSTORE_ARENA:
+        # Indexes built before the arena docstore existed
+        vector_store = FAISS.load_local(index_path, embedding_model, allow_dangerous_deserialization=True)
+        apply_search_params(vector_store.index, index_type, manifest.get("index_params", {}))
+        return vector_store
+
+    index = faiss.read_index(os.path.join(index_path, FAISS_FILE_NAME))
+    apply_search_params(index, index_type, manifest.get("index_params", {}))
+    return FAISS(embedding_model, index, MmapDocstore(index_path), DocstoreIdMap(index.ntotal))
@@ -0,0 +1,216 @@
+# File: lab_values.py
+# Rule-based lab-value extraction for the report summarizer.
+# The common metrics are found in the OCR text with regular expressions, converted
+# to the table's unit and assessed against REFERENCE_RANGES locally, so the LLM
+# only has to write the narrative parts of the summary.
+#
+# The table can be overridden with a JSON file named by LAB_REFERENCE_RANGES_FILE,
+# using the same keys, e.g. {"LDL Cholesterol": {"high": 130, "inclusive": false}}.
+
+import json
+import os
+import re
+
+# --- Reference Ranges ---
+# A value is healthy when it lies between "low" and "high" (either may be missing);
+# "inclusive" says whether the bounds themselves count as healthy.
+REFERENCE_RANGES = {
+    "Blood Pressure": {"unit": "mmHg", "high": [120, 80], "inclusive": False},
+    "Total Cholesterol": {"unit": "mg/dL", "high": 200, "inclusive": False},
+    "LDL Cholesterol": {"unit": "mg/dL", "high": 100, "inclusive": False},
+    "HDL Cholesterol": {"unit": "mg/dL", "low": 60, "inclusive": False},
+    "Triglycerides": {"unit": "mg/dL", "high": 150, "inclusive": False},
+    "Hemoglobin A1c": {"unit": "%", "high": 5.7, "inclusive": False},
+    "WBC": {"unit": "x10^9/L", "low": 4.5, "high": 11.0, "inclusive": True},
+    "Hemoglobin": {"unit": "g/dL", "low": 12.0, "high": 17.5, "inclusive": True,
+                   "male": {"low": 13.5, "high": 17.5}, "female": {"low": 12.0, "high": 15.5}},
+}
+LAB_REFERENCE_RANGES_FILE = os.environ.get("LAB_REFERENCE_RANGES_FILE", "")
+
+# Readings outside these bounds (in the table unit) are not plausible in that unit. A value
+# printed without a unit is assessed in the first unit of ALTERNATIVE_UNITS that makes it plausible.
+PLAUSIBLE_RANGES = {
+    "Total Cholesterol": (50, 600),
+    "LDL Cholesterol": (10, 400),
+    "HDL Cholesterol": (5, 200),
+    "Triglycerides": (20, 5000),
+    "Hemoglobin A1c": (3, 20),
+    "WBC": (0.1, 100),
+    "Hemoglobin": (3, 25),
+}
+ALTERNATIVE_UNITS = {
+    "Total Cholesterol": "mmol/l",
+    "LDL Cholesterol": "mmol/l",
+    "HDL Cholesterol": "mmol/l",
+    "Triglycerides": "mmol/l",
+    "Hemoglobin A1c": "mmol/mol",
+    "WBC": "/ul",
+    "Hemoglobin": "g/l",
+}
+NOT_ASSESSED = "Not assessed (unit not stated)"
+
+# --- Patterns ---
+# Names are tried in this order, so "LDL Cholesterol" is never read as total cholesterol
+METRIC_NAME_PATTERNS = {
+    "Blood Pressure": r"blood\s+pressure|\bB\.?P\b",
+    "LDL Cholesterol": r"\bLDL(?:[-\s]?C\b|\s+cholesterol)?|low[-\s]density\s+lipoprotein(?:\s+cholesterol)?",
+    "HDL Cholesterol": r"(?<!non-)(?<!non\s)\bHDL(?:[-\s]?C\b|\s+cholesterol)?"
+                       r"|high[-\s]density\s+lipoprotein(?:\s+cholesterol)?",
+    "Total Cholesterol": r"total\s+cholesterol|cholesterol,?\s+total"
+                         r"|(?<!LDL\s)(?<!HDL\s)(?<!LDL-)(?<!HDL-)\bcholesterol\b(?!,?\s+V?[LH]DL\b)",
+    "Triglycerides": r"triglycerides?|\bTRIG\b|\bTG\b",
+    "Hemoglobin A1c": r"\bHbA1c\b|(?:h(?:a)?emoglobin|\bHg?b)\s*A1c|\bA1c\b|glycated\s+h(?:a)?emoglobin",
+    "WBC": r"\bWBC\b|white\s+blood\s+cell(?:s|\s+count)?|\bleukocytes?\b|\bTLC\b",
+    "Hemoglobin": r"(?<!glycated\s)\b(?:h(?:a)?emoglobin|Hgb|Hb)\b(?!\s*A1c)",
+}
+UNIT_PATTERN = (r"mg/dl|mmol/l|mmol/mol|g/dl|g/l|%|mm\s*hg"
+                r"|(?:x\s*)?10\^?9\s*/\s*l|(?:x\s*)?10\^?3\s*/\s*(?:µl|ul|mcl)|k/(?:µl|ul)"
+                r"|(?:cells)?\s*/\s*(?:µl|ul|mcl|mm3|cu\s*mm)")
+# Thousands separators are allowed, e.g. "7,500 /uL"
+NUMBER_PATTERN = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+# Up to 30 characters of label text ("(calc)", ":", "Result") may sit between name and value;
+# a number glued to a letter is part of a name such as "HbA1c", not a value
+VALUE_PATTERN = (r"[^\d\n]{0,30}?(?<![A-Za-z])(" + NUMBER_PATTERN + r")(?:\s*/\s*(" + NUMBER_PATTERN + r"))?"
+                 r"\s*(" + UNIT_PATTERN + r")?")
+
+_METRIC_PATTERNS = {metric: re.compile(r"(?:" + pattern + r")" + VALUE_PATTERN, re.IGNORECASE)
+                    for metric, pattern in METRIC_NAME_PATTERNS.items()}
+_SEX_PATTERN = re.compile(r"\b(?:sex|gender)\s*[:\-]?\s*(male|female|m|f)\b|\b(male|female)\b", re.IGNORECASE)
+
+
+def load_reference_ranges(path: str = LAB_REFERENCE_RANGES_FILE) -> dict:
+    ranges = {metric: dict(entry) for metric, entry in REFERENCE_RANGES.items()}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for metric, overrides in json.load(f).items():
+                ranges.setdefault(metric, {}).update(overrides)
+    return ranges
+
+
+def _normalize_unit(unit: str) -> str:
+    unit = re.sub(r"\s+", "", unit or "").lower().replace("µ", "u").replace("mcl", "ul")
+    return unit.replace("cumm", "mm3")
+
+
+def convert_to_table_unit(metric: str, value: float, unit: str) -> float:
+    """Converts the common alternative units to the ones used in the reference table."""
+    unit = _normalize_unit(unit)
+    if metric in ("Total Cholesterol", "LDL Cholesterol", "HDL Cholesterol") and unit == "mmol/l":
+        return value * 38.67
+    if metric == "Triglycerides" and unit == "mmol/l":
+        return value * 88.57
+    if metric == "Hemoglobin A1c" and unit == "mmol/mol":
+        return value / 10.929 + 2.15
+    if metric == "Hemoglobin" and unit == "g/l":
+        return value / 10
+    if metric == "WBC" and (unit.endswith("/ul") or unit.endswith("/mm3")) and "10^3" not in unit \
+            and not unit.startswith("k/") and value > 100:
+        # Plain counts per microlitre, e.g. 7500 /uL
+        return value / 1000
+    return value
+
+
+def infer_table_value(metric: str, value: float):
+    """For a reading printed without a unit: its value in the table unit when that is unambiguous, else None."""
+    if metric not in PLAUSIBLE_RANGES:
+        return value
+    low, high = PLAUSIBLE_RANGES[metric]
+    for unit in ("", ALTERNATIVE_UNITS.get(metric)):
+        if unit is None:
+            continue
+        converted = convert_to_table_unit(metric, value, unit)
+        if (unit == "" or converted != value) and low <= converted <= high:
+            return converted
+    return None
+
+
+def detect_sex(text: str):
+    match = _SEX_PATTERN.search(text)
+    if not match:
+        return None
+    word = (match.group(1) or match.group(2)).lower()
+    return "male" if word in ("male", "m") else "female"
+
+
+def _healthy_range(reference: dict, sex) -> tuple:
+    bounds = (reference.get(sex) or {}) if sex else {}
+    return bounds.get("low", reference.get("low")), bounds.get("high", reference.get("high"))
+
+
+def _describe_range(low, high, inclusive: bool, unit: str) -> str:
+    if low is not None and high is not None:
+        return f"{low}-{high} {unit}"
+    if high is not None:
+        return f"{'<=' if inclusive else '<'} {high} {unit}"
+    return f"{'>=' if inclusive else '>'} {low} {unit}"
+
+
+def assess(metric: str, value, reference: dict, sex=None) -> str:
+    low, high = _healthy_range(reference, sex)
+    inclusive = reference.get("inclusive", True)
+    unit = reference.get("unit", "")
+    if metric == "Blood Pressure":
+        systolic, diastolic = value
+        limit_systolic, limit_diastolic = high
+        elevated = systolic >= limit_systolic or diastolic >= limit_diastolic
+        healthy = f"< {limit_systolic}/{limit_diastolic} {unit}"
+        return f"{'High' if elevated else 'Normal'} (healthy: {healthy})"
+
+    def below(bound):
+        return value < bound if inclusive else value <= bound
+
+    def above(bound):
+        return value > bound if inclusive else value >= bound
+
+    if low is not None and below(low):
+        status = "Low"
+    elif high is not None and above(high):
+        status = "High"
+    else:
+        status = "Normal"
+    suffix = f", {sex}" if sex and reference.get(sex) else ""
+    return f"{status} (healthy: {_describe_range(low, high, inclusive, unit)}{suffix})"
+
+
+def _format_number(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def extract_lab_values(text: str, reference_ranges: dict = None) -> list:
+    """
+    Finds the metrics of the reference table in a report and assesses them.
+    Returns lab_analysis entries ({"metric", "value", "assessment"}), first occurrence of each metric only.
+    """
+    reference_ranges = reference_ranges or load_reference_ranges()
+    sex = detect_sex(text)
+    found = []
+    for metric, pattern in _METRIC_PATTERNS.items():
+        if metric not in reference_ranges:
+            continue
+        reference = reference_ranges[metric]
+        for match in pattern.finditer(text):
+            first, second, unit = match.group(1), match.group(2), match.group(3)
+            if metric == "Blood Pressure":
+                if second is None:
+                    continue
+                value = (int(float(first)), int(float(second)))
+                shown = f"{value[0]}/{value[1]} mmHg"
+            else:
+                if second is not None:
+                    # A ratio or a range such as "4.5/11.0" is not a single reading
+                    continue
+                number = float(first.replace(",", ""))
+                if unit:
+                    value = convert_to_table_unit(metric, number, unit)
+                    shown = f"{first} {unit.strip()}"
+                else:
+                    # Only the number is shown; the table unit is never assumed for it
+                    value = infer_table_value(metric, number)
+                    shown = first
+                if value is not None and value != number and _normalize_unit(unit) != _normalize_unit(reference.get("unit")):
+                    shown += f" ({_format_number(value)} {reference.get('unit', '')})"
+            assessment = assess(metric, value, reference, sex) if value is not None else NOT_ASSESSED
+            found.append((match.start(), {"metric": metric, "value": shown, "assessment": assessment}))
+            break
+    # Keep the report's own order
+    return [entry for _, entry in sorted(found, key=lambda item: item[0])]
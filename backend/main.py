@@ -14,10 +14,11 @@ load_dotenv()
 
 # --- Import all agent classes ---
 from agent_symptom import SymptomIdentifierAgent
-from agent_rag import RagAgent
+from agent_rag import RagAgent, knowledge_base
 from agent_summarizer import MedicalReportSummarizerAgent
 from agent_extractor import DataExtractorAgent
 from agent_finder import DoctorFinderAgent
+from prefetch import prefetcher, PREFETCH_ENABLED
 
 
 # --- State Definition ---
@@ -26,6 +27,8 @@ class AppState(TypedDict):
     health_issue: str
     extracted_text: str
     image_path: str
+    image_paths: list
+    extraction_error: str
 
 
 # --- Model Initialization ---
@@ -112,6 +115,15 @@ def intelligent_router(state: AppState) -> str:
 
 
 def after_extraction(state: AppState) -> str:
+    extraction_error = state.get("extraction_error")
+    if extraction_error:
+        # Never let the summarizer "summarize" an error message
+        print(f"---Extraction Error---: {extraction_error}")
+        state['messages'].append(AIMessage(content=f"I couldn't read the uploaded report: {extraction_error}"))
+        state['image_path'] = ""
+        state['image_paths'] = []
+        return END
+
     extracted_text = state.get("extracted_text", "").lower()
     expected_keywords = ["patient", "report", "lab", "doctor", "impression", "results", "clinical"]
 
@@ -120,6 +132,7 @@ def after_extraction(state: AppState) -> str:
         state['messages'].append(AIMessage(
             content="I was unable to read the provided medical report image, or the content was not recognized as a report. Please try again with a clearer image."))
         state['image_path'] = ""
+        state['image_paths'] = []
         return END
     else:
         print("---Extraction Success---")
@@ -138,11 +151,40 @@ graph_builder.add_node("summarizer_agent", summarizer_agent)
 graph_builder.add_node("extractor_agent", extractor_agent)
 
 
+# Work each agent can have started speculatively while the router is deciding
+PREFETCH_KINDS = {"symptom_agent": "symptom_retrieval", "rag_agent": "rag_context"}
+
+
+def start_prefetches(state: AppState) -> list:
+    """Starts retrieval for the agents the router is likely to pick; returns the started (kind, key) pairs."""
+    started = []
+    if not state.get("messages"):
+        return started
+    user_message = state['messages'][-1].content
+    prefetcher.start("symptom_retrieval", user_message, symptom_agent._retrieve, user_message)
+    started.append(("symptom_retrieval", user_message))
+    health_issue = state.get("health_issue")
+    if health_issue:
+        prefetcher.start("rag_context", health_issue, knowledge_base.get_all_context_for_issue, health_issue)
+        started.append(("rag_context", health_issue))
+    return started
+
+
 def entry_point_router(state: AppState):
     """First router to decide between image processing and text routing."""
     if state.get("image_path"):
         return "extractor_agent"
-    return intelligent_router(state)
+    # Only worth it when routing is a slow remote call
+    if not (PREFETCH_ENABLED and gemini_model):
+        return intelligent_router(state)
+
+    started = start_prefetches(state)
+    route = intelligent_router(state)
+    # Whatever the chosen agent will not claim is dropped and counted as wasted
+    for kind, key in started:
+        if PREFETCH_KINDS.get(route) != kind:
+            prefetcher.discard(kind, key)
+    return route
 
 
 # Set the conditional entry point for the graph
@@ -2,9 +2,15 @@
 
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 
+from circuit_breaker import HEDGE_REQUESTS, CircuitBreaker, CircuitOpenError, HedgedCaller
+from http_pool import DEFAULT_TIMEOUT, create_session
+from metrics import metrics
+from places_cache import PlacesResultCache, places_cache_key
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -14,6 +20,75 @@ app = Flask(__name__)
 # Get the Google Maps API key from environment variables
 API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
 
+# Point at places_stub.py (e.g. http://127.0.0.1:5002) to load-test without the live API
+PLACES_API_BASE_URL = os.environ.get("PLACES_API_BASE_URL", "https://maps.googleapis.com").rstrip("/")
+PLACES_TEXT_SEARCH_URL = f"{PLACES_API_BASE_URL}/maps/api/place/textsearch/json"
+
+# One keep-alive session for all Places API calls
+places_session = create_session()
+# Fails fast while the Places API is down; stale cache entries are still served meanwhile
+places_breaker = CircuitBreaker("places_api", failure_exceptions=(requests.exceptions.RequestException,))
+places_hedger = HedgedCaller("places_api") if HEDGE_REQUESTS else None
+
+places_cache = PlacesResultCache()
+# Any other status (OVER_QUERY_LIMIT, REQUEST_DENIED, INVALID_REQUEST, ...) is an error, even with HTTP 200
+PLACES_OK_STATUSES = ("OK", "ZERO_RESULTS")
+# Background refreshes of stale cache entries
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="places-refresh")
+
+
+class PlacesApiError(requests.exceptions.RequestException):
+    """An error reported in the body of an HTTP 200 Places response; never cached, counted by the breaker."""
+
+
+def search_places(specialty: str, location: str) -> list:
+    """
+    Calls the Places text search through the circuit breaker and returns the top 5 results.
+    Raises RequestException on failure, or CircuitOpenError while the breaker is open.
+    """
+    if places_hedger:
+        return places_breaker.call(places_hedger.call, _text_search, specialty, location)
+    return places_breaker.call(_text_search, specialty, location)
+
+
+def _text_search(specialty: str, location: str) -> list:
+    # Define the Google Maps API parameters
+    query = f"{specialty} in {location}"
+    params = {
+        'query': query,
+        'key': API_KEY
+    }
+
+    # Make the live API request to Google
+    with metrics.timer("mcp.places_request"):
+        response = places_session.get(PLACES_TEXT_SEARCH_URL, params=params, timeout=DEFAULT_TIMEOUT)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    body = response.json()
+    status = body.get('status', 'OK')
+    if status not in PLACES_OK_STATUSES:
+        raise PlacesApiError(f"Places API returned {status}: {body.get('error_message', 'no details')}")
+    results = body.get('results', [])
+
+    # Format the real results into a clean list
+    formatted_results = []
+    for place in results[:5]:  # Return the top 5 results
+        formatted_results.append({
+            "name": place.get('name', 'N/A'),
+            "address": place.get('formatted_address', 'N/A'),
+            "rating": place.get('rating', 'N/A')
+        })
+    return formatted_results
+
+
+def _refresh(key: str, specialty: str, location: str):
+    try:
+        places_cache.put(key, search_places(specialty, location))
+        metrics.increment("mcp.places_cache.refreshes")
+    except (requests.exceptions.RequestException, CircuitOpenError) as e:
+        metrics.increment("mcp.places_errors")
+        places_cache.refresh_failed(key)
+        print(f"---MCP Server---: Background refresh for '{specialty}' in '{location}' failed: {e}")
+
 
 @app.route('/find_doctors', methods=['POST'])
 def find_doctors():
@@ -21,8 +96,10 @@ def find_doctors():
     API endpoint that receives a request from the agent, calls the
     Google Maps Places API, and returns real-time doctor information.
     """
+    # Problems with the Places side are answered with 503, which the finder agent's circuit
+    # breaker does not count against this server
     if not API_KEY:
-        return jsonify({"error": "Google Maps API key is not configured on the server."}), 500
+        return jsonify({"error": "Google Maps API key is not configured on the server."}), 503
 
     # Get the specialty and location from the agent's request
     data = request.get_json()
@@ -34,37 +111,35 @@ def find_doctors():
 
     print(f"---MCP Server---: Received request to find '{specialty}' in '{location}'")
 
-    # Define the Google Maps API endpoint and parameters
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    query = f"{specialty} in {location}"
-    params = {
-        'query': query,
-        'key': API_KEY
-    }
+    key = places_cache_key(specialty, location)
+    cached = places_cache.get(key)
+    if cached is not None:
+        results, needs_refresh = cached
+        if needs_refresh:
+            print(f"---MCP Server---: Serving stale results for '{specialty}' in '{location}', refreshing.")
+            _refresh_executor.submit(_refresh, key, specialty, location)
+        print(f"---MCP Server---: Returning {len(results)} cached results.")
+        return jsonify(results)
 
     try:
-        # Make the live API request to Google
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        results = response.json().get('results', [])
-
-        if not results:
-            return jsonify([])  # Return an empty list instead of an error
-
-        # Format the real results into a clean list
-        formatted_results = []
-        for place in results[:5]:  # Return the top 5 results
-            formatted_results.append({
-                "name": place.get('name', 'N/A'),
-                "address": place.get('formatted_address', 'N/A'),
-                "rating": place.get('rating', 'N/A')
-            })
-
-        print(f"---MCP Server---: Returning {len(formatted_results)} results.")
-        return jsonify(formatted_results)
-
+        formatted_results = search_places(specialty, location)
+    except CircuitOpenError as e:
+        return jsonify({"error": f"The Google Maps API is temporarily unavailable: {e}"}), 503
     except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Failed to connect to Google Maps API: {e}"}), 500
+        metrics.increment("mcp.places_errors")
+        return jsonify({"error": f"Google Maps API request failed: {e}"}), 503
+
+    places_cache.put(key, formatted_results)
+    print(f"---MCP Server---: Returning {len(formatted_results)} results.")
+    return jsonify(formatted_results)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Returns this server's Places API latency, error counts, breaker state and cache statistics."""
+    snapshot = metrics.snapshot()
+    snapshot["places_cache"] = places_cache.stats()
+    return jsonify(snapshot)
 
 
 if __name__ == '__main__':
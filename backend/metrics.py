@@ -0,0 +1,69 @@
+# File: metrics.py
+# Process-wide counters, gauges and timings shared by the agents.
+# app.py exposes a snapshot at /metrics.
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Only the most recent samples of each timing are kept for the percentiles
+MAX_TIMING_SAMPLES = 1000
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def record_timing(self, name: str, seconds: float):
+        with self._lock:
+            if name not in self._timings:
+                self._timings[name] = deque(maxlen=MAX_TIMING_SAMPLES)
+            self._timings[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Records how long the with-block took, even if it raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_timing(name, time.perf_counter() - start)
+
+    @staticmethod
+    def _summarize(samples) -> dict:
+        ordered = sorted(samples)
+        count = len(ordered)
+        return {
+            "count": count,
+            "mean_ms": round(sum(ordered) / count * 1000, 2),
+            "p50_ms": round(ordered[count // 2] * 1000, 2),
+            "p95_ms": round(ordered[min(count - 1, int(count * 0.95))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {name: list(samples) for name, samples in self._timings.items() if samples}
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "timings": {name: self._summarize(samples) for name, samples in timings.items()},
+        }
+
+
+# --- Global Instance ---
+metrics = MetricsRegistry()
@@ -0,0 +1,66 @@
+# File: ocr_cache.py
+# Persistent cache of vision-model transcriptions. Entries are keyed on the SHA-256
+# of the normalized image bytes plus the extraction prompt version, so re-uploading
+# the same report (in any session) skips the model, while a prompt change or
+# different normalization settings produce new keys.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+# --- Cache Configuration ---
+OCR_CACHE_DB = os.environ.get("OCR_CACHE_DB", "ocr_cache.sqlite")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def ocr_cache_key(image_bytes: bytes, prompt_version: str) -> str:
+    digest = hashlib.sha256(image_bytes)
+    digest.update(b"\0" + prompt_version.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OcrResultCache:
+    """SQLite-backed store of transcriptions; the least recently used are evicted beyond max_bytes."""
+
+    def __init__(self, db_path: str = OCR_CACHE_DB, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS ocr_results (key TEXT PRIMARY KEY, text TEXT, "
+                         "size INTEGER, last_used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results (last_used)")
+        self._db.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT text FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                metrics.increment("ocr_cache.misses")
+                return None
+            self._db.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        metrics.increment("ocr_cache.hits")
+        return row[0]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?)", (key, text, size, time.time()))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+            evicted = 0
+            while total > self.max_bytes:
+                oldest = self._db.execute("SELECT key, size FROM ocr_results WHERE key != ? "
+                                          "ORDER BY last_used LIMIT 1", (key,)).fetchone()
+                if oldest is None:
+                    break
+                self._db.execute("DELETE FROM ocr_results WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                evicted += 1
+            self._db.commit()
+        if evicted:
+            metrics.increment("ocr_cache.evictions", evicted)
+        metrics.set_gauge("ocr_cache.bytes", total)
@@ -0,0 +1,132 @@
+# File: places_cache.py
+# Cache of doctor search results for the MCP server, keyed on the normalized
+# (specialty, location) pair. Entries are fresh for ttl seconds; for a further
+# stale_ttl seconds they are still served, but the caller is told to refresh them
+# in the background (stale-while-revalidate). The least recently used entries are
+# evicted beyond max_entries, and an optional SQLite file keeps them across restarts.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+# --- Places Cache Configuration ---
+PLACES_CACHE_TTL = float(os.environ.get("PLACES_CACHE_TTL", str(24 * 3600)))
+# How long past the TTL an entry may still be served while it is refreshed
+PLACES_CACHE_STALE_TTL = float(os.environ.get("PLACES_CACHE_STALE_TTL", str(7 * 24 * 3600)))
+PLACES_CACHE_SIZE = int(os.environ.get("PLACES_CACHE_SIZE", "1000"))
+# Set to a file path (e.g. "places_cache.sqlite") to keep results across restarts
+PLACES_CACHE_DB = os.environ.get("PLACES_CACHE_DB", "")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s,]+", " ", text).strip().lower()
+
+
+def places_cache_key(specialty: str, location: str) -> str:
+    return f"{_normalize(specialty)}\0{_normalize(location)}"
+
+
+class PlacesResultCache:
+    def __init__(self, ttl: float = PLACES_CACHE_TTL, stale_ttl: float = PLACES_CACHE_STALE_TTL,
+                 max_entries: int = PLACES_CACHE_SIZE, db_path: str = PLACES_CACHE_DB):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (fetched_at, results)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS places_results (key TEXT PRIMARY KEY, "
+                             "fetched_at REAL, results TEXT)")
+            self._load()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl - self.stale_ttl
+        self._db.execute("DELETE FROM places_results WHERE fetched_at < ?", (cutoff,))
+        self._db.commit()
+        rows = self._db.execute("SELECT key, fetched_at, results FROM places_results "
+                                "ORDER BY fetched_at DESC LIMIT ?", (self.max_entries,)).fetchall()
+        for key, fetched_at, results in reversed(rows):
+            self._entries[key] = (fetched_at, json.loads(results))
+        if rows:
+            print(f"---Places Cache---: Restored {len(rows)} cached searches.")
+
+    def _delete(self, key: str):
+        # Caller holds the lock
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM places_results WHERE key = ?", (key,))
+            self._db.commit()
+
+    def get(self, key: str):
+        """
+        Returns (results, needs_refresh), or None on a miss. needs_refresh is True for a
+        stale entry the first time it is served, so only one background refresh starts.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.time() - entry[0] if entry else None
+            if entry is None or age > self.ttl + self.stale_ttl:
+                if entry is not None:
+                    self._delete(key)
+                self.misses += 1
+                metrics.increment("mcp.places_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+            if age <= self.ttl:
+                self.hits += 1
+                metrics.increment("mcp.places_cache.hits")
+                return entry[1], False
+            self.stale_hits += 1
+            metrics.increment("mcp.places_cache.stale_hits")
+            needs_refresh = key not in self._refreshing
+            self._refreshing.add(key)
+            return entry[1], needs_refresh
+
+    def put(self, key: str, results: list):
+        fetched_at = time.time()
+        with self._lock:
+            self._refreshing.discard(key)
+            self._entries[key] = (fetched_at, results)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self.evictions += len(evicted)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO places_results VALUES (?, ?, ?)",
+                                 (key, fetched_at, json.dumps(results)))
+                self._db.executemany("DELETE FROM places_results WHERE key = ?", [(k,) for k in evicted])
+                self._db.commit()
+        if evicted:
+            metrics.increment("mcp.places_cache.evictions", len(evicted))
+
+    def refresh_failed(self, key: str):
+        """Lets the next stale hit try again."""
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshing": len(self._refreshing),
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
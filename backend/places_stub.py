@@ -0,0 +1,111 @@
+# File: places_stub.py
+# Local stand-in for the Google Places text-search API, for load tests and CI.
+# It serves /maps/api/place/textsearch/json with canned results from a JSON file or
+# deterministic generated ones, after an injected latency, and fails a configurable
+# share of requests. Point the MCP server at it with
+#   PLACES_API_BASE_URL=http://127.0.0.1:5002 GOOGLE_MAPS_API_KEY=stub python mcp_server.py
+# Usage: python places_stub.py --latency-ms 120 --latency-sigma 0.5 --error-rate 0.02
+
+import argparse
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+_SURNAMES = ("Sharma", "Verma", "Iyer", "Reddy", "Patel", "Gupta", "Khan", "Nair", "Mehta", "Rao", "Das", "Singh")
+_STREETS = ("MG Road", "Station Road", "Civil Lines", "Hospital Road", "Park Street", "Ring Road", "Main Bazaar")
+
+
+@dataclass
+class StubConfig:
+    # Median latency and the sigma of its log-normal spread (0 gives a constant latency)
+    latency_ms: float = 100.0
+    latency_sigma: float = 0.0
+    # A share of requests takes tail_ms instead, to exercise hedging and p99s
+    tail_rate: float = 0.0
+    tail_ms: float = 3000.0
+    # A share of requests fails with HTTP 500, or hangs for hang_seconds to trip client timeouts
+    error_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_seconds: float = 30.0
+    results_per_query: int = 5
+    # Optional {"query": [place, ...]} file; queries not in it get generated results
+    canned_results: dict = None
+    seed: int = None
+
+
+stub_config = StubConfig()
+_random = random.Random()
+
+
+def generated_results(query: str, count: int) -> list:
+    """The same query always produces the same places, like a real (slowly changing) index."""
+    rng = random.Random(hashlib.sha256(query.lower().encode("utf-8")).hexdigest())
+    specialty, _, location = query.partition(" in ")
+    results = []
+    for _ in range(count):
+        surname = rng.choice(_SURNAMES)
+        results.append({
+            "name": f"Dr. {surname} {specialty.strip().title()} Clinic",
+            "formatted_address": f"{rng.randint(1, 400)} {rng.choice(_STREETS)}, {location.strip() or 'Unknown'}",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "place_id": hashlib.sha1(f"{query}{surname}{len(results)}".encode("utf-8")).hexdigest()[:27],
+        })
+    return results
+
+
+def _injected_delay() -> float:
+    if _random.random() < stub_config.tail_rate:
+        return stub_config.tail_ms / 1000
+    return stub_config.latency_ms / 1000 * _random.lognormvariate(0, stub_config.latency_sigma)
+
+
+@app.route('/maps/api/place/textsearch/json', methods=['GET'])
+def text_search():
+    query = request.args.get('query', '')
+    if not request.args.get('key'):
+        return jsonify({"results": [], "status": "REQUEST_DENIED", "error_message": "Missing API key."})
+    roll = _random.random()
+    if roll < stub_config.hang_rate:
+        time.sleep(stub_config.hang_seconds)
+    time.sleep(_injected_delay())
+    if roll >= 1 - stub_config.error_rate:
+        return jsonify({"results": [], "status": "UNKNOWN_ERROR"}), 500
+
+    canned = stub_config.canned_results or {}
+    results = canned.get(query.lower(), canned.get("*"))
+    if results is None:
+        results = generated_results(query, stub_config.results_per_query)
+    return jsonify({"results": results, "status": "OK" if results else "ZERO_RESULTS"})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the Google Places text-search API.")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Median response latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Log-normal spread of the latency.")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of requests answered after --tail-ms.")
+    parser.add_argument("--tail-ms", type=float, default=3000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with HTTP 500.")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of requests stalled for --hang-seconds.")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--results", type=int, default=5, help="Generated results per query.")
+    parser.add_argument("--results-file", help='Canned results: {"cardiologist in bhopal": [...], "*": [...]}.')
+    parser.add_argument("--seed", type=int, help="Seed for repeatable latency and error injection.")
+    args = parser.parse_args()
+
+    canned_results = None
+    if args.results_file:
+        with open(args.results_file, 'r', encoding='utf-8') as f:
+            canned_results = {query.lower(): places for query, places in json.load(f).items()}
+    stub_config = StubConfig(args.latency_ms, args.latency_sigma, args.tail_rate, args.tail_ms, args.error_rate,
+                             args.hang_rate, args.hang_seconds, args.results, canned_results, args.seed)
+    _random.seed(args.seed)
+    print(f"---Places Stub---: Serving on port {args.port} with {stub_config}")
+    # threaded=True so slow responses overlap like a real upstream
+    app.run(port=args.port, threaded=True)
@@ -0,0 +1,82 @@
+# File: prefetch.py
+# Speculative work started by the graph entry point while the router is still deciding.
+# Results are keyed by (kind, key), e.g. ("symptom_retrieval", <user message>), and live
+# outside the LangGraph state so nothing unpicklable ends up in saved sessions.
+# The agent that ends up handling the turn claims its prefetch; everything else is
+# discarded and counted as wasted work in the metrics.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+# --- Prefetch Configuration ---
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "4"))
+# Unclaimed prefetches older than this are dropped the next time something is started
+PREFETCH_TTL = float(os.environ.get("PREFETCH_TTL", "120"))
+
+
+class SpeculativePrefetcher:
+    def __init__(self, max_workers: int = PREFETCH_WORKERS, ttl: float = PREFETCH_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending = {}  # (kind, key) -> (started_at, future, [work seconds])
+
+    def start(self, kind: str, key: str, fn, *args):
+        """Starts fn(*args) in the background unless the same prefetch is already in flight."""
+        self._expire()
+        with self._lock:
+            if (kind, key) in self._pending:
+                return
+            work = []
+
+            def run():
+                start = time.perf_counter()
+                try:
+                    return fn(*args)
+                finally:
+                    work.append(time.perf_counter() - start)
+
+            self._pending[(kind, key)] = (time.time(), self._executor.submit(run), work)
+        metrics.increment(f"prefetch.{kind}.started")
+
+    def claim(self, kind: str, key: str):
+        """Returns the prefetch's future for the agent to wait on, or None if nothing was prefetched."""
+        with self._lock:
+            entry = self._pending.pop((kind, key), None)
+        if entry is None:
+            return None
+        metrics.increment(f"prefetch.{kind}.used")
+        return entry[1]
+
+    def discard(self, kind: str, key: str):
+        with self._lock:
+            entry = self._pending.pop((kind, key), None)
+        if entry is not None:
+            self._record_waste(kind, entry)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            stale = [(k, entry) for k, entry in self._pending.items() if entry[0] < cutoff]
+            for k, _ in stale:
+                del self._pending[k]
+        for (kind, _), entry in stale:
+            self._record_waste(kind, entry)
+
+    @staticmethod
+    def _record_waste(kind: str, entry):
+        _, future, work = entry
+        metrics.increment(f"prefetch.{kind}.wasted")
+        if future.cancel():
+            # Never got a worker, so no work was lost
+            return
+        future.add_done_callback(lambda _: metrics.record_timing(f"prefetch.{kind}.wasted_work", sum(work)))
+
+
+# --- Global Instance ---
+prefetcher = SpeculativePrefetcher()
@@ -1,18 +1,243 @@
 # File: preprocess.py
 # This script creates a SINGLE, unified vector store with metadata.
 # Run this file once before running the main application.
+# Re-running it is incremental: only new or changed rows are sent to the embedding model.
 
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
 import pandas as pd
 import pickle
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
 from langchain_ollama import OllamaEmbeddings
 
+from bm25_index import BM25Builder
+from category_classifier import CategoryPrototypeBuilder, load_category_labels
+from centroid_index import FocusAreaCentroidBuilder
+from dedup import DuplicateDetector, DEDUP_MODES, DEFAULT_DEDUP_MODE, NEAR_DUPLICATE_THRESHOLD
+from embedding_pipeline import EmbeddingPipeline, EMBED_BATCH_SIZE, EMBED_CONCURRENCY
+from index_store import IndexWriter, write_manifest, DOCSTORE_ARENA, INDEX_TYPES, DEFAULT_INDEX_TYPE
+
+# --- Build Configuration ---
+CHECKPOINT_DIR_NAME = "embedding_checkpoint"
+REQUIRED_COLUMNS = ['question', 'answer', 'focus_area']
+STREAM_CHUNK_SIZE = 5000
+
+
+def row_content_hash(question: str, answer: str, focus_area: str) -> str:
+    """Returns a stable SHA-256 hash of the (question, answer, focus_area) triple."""
+    payload = json.dumps([question, answer, focus_area], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def answer_hash(answer: str) -> str:
+    """Returns the SHA-256 hash of the answer text, the only text that is embedded."""
+    return hashlib.sha256(answer.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCheckpoint:
+    """
+    On-disk store of embeddings keyed by answer hash, so editing a row's question or
+    focus_area, or which row of a duplicate group comes first, never re-embeds its answer.
+    Every flushed batch is a pair of files: batch_NNNNN.npy holds the vectors and
+    batch_NNNNN.json the matching answer hashes. A batch only counts once its .json
+    file exists, so a crash mid-write never leaves a half-valid batch behind.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._locations = {}  # content hash -> (batch stem, row within batch)
+        self._arrays = {}
+        self._next_batch = 0
+        self._load()
+
+    def _load(self):
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("batch_") and name.endswith(".json")):
+                continue
+            stem = name[:-len(".json")]
+            if not os.path.exists(os.path.join(self.directory, stem + ".npy")):
+                continue
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                hashes = json.load(f)
+            for row, content_hash in enumerate(hashes):
+                self._locations[content_hash] = (stem, row)
+            self._next_batch = max(self._next_batch, int(stem.split("_")[1]) + 1)
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._locations
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __iter__(self):
+        return iter(list(self._locations))
+
+    def get(self, content_hash: str) -> np.ndarray:
+        stem, row = self._locations[content_hash]
+        if stem not in self._arrays:
+            self._arrays[stem] = np.load(os.path.join(self.directory, stem + ".npy"), mmap_mode="r")
+        return np.asarray(self._arrays[stem][row], dtype=np.float32)
+
+    def append(self, hashes: list, vectors):
+        """Persists one batch of embeddings before it is made visible to readers."""
+        stem = f"batch_{self._next_batch:05d}"
+        self._next_batch += 1
+        self._write_batch(stem, hashes, np.asarray(vectors, dtype=np.float32))
+        for row, content_hash in enumerate(hashes):
+            self._locations[content_hash] = (stem, row)
+
+    def _write_batch(self, stem: str, hashes: list, vectors: np.ndarray):
+        npy_path = os.path.join(self.directory, stem + ".npy")
+        json_path = os.path.join(self.directory, stem + ".json")
+        with open(npy_path + ".tmp", 'wb') as f:
+            np.save(f, vectors)
+        os.replace(npy_path + ".tmp", npy_path)
+        with open(json_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(hashes, f)
+        os.replace(json_path + ".tmp", json_path)
+
+    def prune(self, live_hashes: set) -> int:
+        """Drops embeddings of rows that no longer exist and compacts the affected batches."""
+        removed = 0
+        rows_by_stem = {}
+        for content_hash, (stem, row) in self._locations.items():
+            rows_by_stem.setdefault(stem, []).append((row, content_hash))
+
+        for stem, rows in rows_by_stem.items():
+            live_rows = sorted((row, h) for row, h in rows if h in live_hashes)
+            if len(live_rows) == len(rows):
+                continue
+            removed += len(rows) - len(live_rows)
+            for _, content_hash in rows:
+                if content_hash not in live_hashes:
+                    del self._locations[content_hash]
+
+            if live_rows:
+                vectors = np.stack([self.get(h) for _, h in live_rows])
+                self._arrays.pop(stem, None)
+                self._write_batch(stem, [h for _, h in live_rows], vectors)
+                for new_row, (_, content_hash) in enumerate(live_rows):
+                    self._locations[content_hash] = (stem, new_row)
+            else:
+                self._arrays.pop(stem, None)
+                os.remove(os.path.join(self.directory, stem + ".json"))
+                os.remove(os.path.join(self.directory, stem + ".npy"))
+        return removed
+
+
+def clean_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Validates the columns, drops incomplete rows and adds the per-row content and answer hashes."""
+    if any(column not in df.columns for column in REQUIRED_COLUMNS):
+        raise ValueError("CSV must contain 'question', 'answer', and 'focus_area' columns.")
+
+    # --- FIX: Clean the data by dropping rows with missing values ---
+    # This prevents the ValidationError by ensuring all data is valid before processing.
+    df = df.dropna(subset=REQUIRED_COLUMNS).copy()
+
+    # The content hash identifies the row; the answer hash its stored embedding
+    df['content_hash'] = [
+        row_content_hash(q, a, f) for q, a, f in zip(df['question'], df['answer'], df['focus_area'])
+    ]
+    df['answer_hash'] = [answer_hash(a) for a in df['answer']]
+    return df
+
+
+def open_checkpoint(output_path: str, model_name: str) -> EmbeddingCheckpoint:
+    """Checkpoints live per embedding model, so switching models never mixes vectors."""
+    safe_model_name = model_name.replace("/", "_").replace(":", "_")
+    return EmbeddingCheckpoint(os.path.join(output_path, CHECKPOINT_DIR_NAME, safe_model_name))
+
+
+def embed_pending_rows(df: pd.DataFrame, checkpoint: EmbeddingCheckpoint, pipeline: EmbeddingPipeline) -> int:
+    """Embeds the answers of df that have no checkpointed vector yet and returns how many there were."""
+    pending = df[[h not in checkpoint for h in df['answer_hash']]].drop_duplicates(subset='answer_hash')
+    if len(pending):
+        # Every finished batch is flushed to disk as soon as it is done
+        pipeline.run(zip(pending['answer_hash'], pending['answer']), checkpoint.append, total=len(pending))
+    return len(pending)
+
+
+def collapse_duplicates(df: pd.DataFrame, detector: DuplicateDetector, written_keys=None,
+                        on_written_duplicate=None) -> pd.DataFrame:
+    """
+    Returns one row per unique answer. Its 'sources' column keeps the focus_area and
+    question of every CSV row the answer stands for, so focus_area lookups still work.
+    Duplicates of answers already written by an earlier chunk are reported through
+    on_written_duplicate(key, source) instead.
+    """
+    written_keys = written_keys or {}
+    unique_rows = {}
+    for question, answer, focus_area, content_hash, answer_key in zip(df['question'], df['answer'], df['focus_area'],
+                                                                      df['content_hash'], df['answer_hash']):
+        key = detector.canonical(content_hash, answer)
+        source = {"focus_area": focus_area, "question": question}
+        if key in written_keys:
+            on_written_duplicate(key, source)
+        elif key in unique_rows:
+            unique_rows[key]['sources'].append(source)
+        else:
+            unique_rows[key] = {"question": question, "answer": answer, "focus_area": focus_area,
+                                "content_hash": key, "answer_hash": answer_key, "sources": [source]}
+    return pd.DataFrame(list(unique_rows.values()),
+                        columns=['question', 'answer', 'focus_area', 'content_hash', 'answer_hash', 'sources'])
+
+
+def row_metadatas(df: pd.DataFrame) -> list:
+    metadatas = []
+    for focus_area, question, sources in zip(df['focus_area'], df['question'], df['sources']):
+        metadata = {"focus_area": focus_area, "question": question}
+        # Only answers shared by several rows carry the full source list
+        if len(sources) > 1:
+            metadata["sources"] = sources
+        metadatas.append(metadata)
+    return metadatas
+
+
+def build_manifest(file_path: str, model_name: str, num_documents: int, docstore: str,
+                   index_type: str, index_params: dict) -> dict:
+    return {
+        "build_id": uuid.uuid4().hex,
+        "built_at": time.time(),
+        "source_file": os.path.abspath(file_path),
+        "embedding_model": model_name,
+        "num_documents": num_documents,
+        "docstore": docstore,
+        "index_type": index_type,
+        "index_params": index_params,
+    }
+
+
+def bm25_text(sources: list, answer: str = "") -> str:
+    """Keyword-searchable text of a document: every source row's focus area and question, then the answer."""
+    return " ".join([f"{source['focus_area']} {source['question']}" for source in sources] + [answer])
+
+
+def save_category_prototypes(prototypes: CategoryPrototypeBuilder, output_path: str):
+    """Writes the body-system prototypes; a corpus with no labellable answers only loses the local classifier."""
+    try:
+        counts = prototypes.save(output_path)
+        print("Saved category prototypes: " + ", ".join(f"{c} ({n} answers)" for c, n in counts.items()))
+    except ValueError as e:
+        print(f"Skipping category prototypes: {e}")
 
-def create_and_save_vector_store(file_path: str, output_path: str):
+
+def create_and_save_vector_store(file_path: str, output_path: str, model_name: str = "nomic-embed-text",
+                                 batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+                                 dedup_mode: str = DEFAULT_DEDUP_MODE,
+                                 dedup_threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                                 index_type: str = DEFAULT_INDEX_TYPE, index_params: dict = None,
+                                 category_labels: str = None):
     """
     Reads a CSV, creates a single FAISS vector store for all documents,
     and saves it to a file. The 'focus_area' is stored as metadata.
+    Embeddings are checkpointed in batches under the output folder, so unchanged
+    rows are reused and an interrupted build resumes where it stopped.
     """
     print("--- Starting Pre-processing ---")
     print("This may still take some time, but it is much more memory-efficient.")
@@ -20,37 +245,55 @@ def create_and_save_vector_store(file_path: str, output_path: str):
     try:
         # Initialize the embedding model
         print("Initializing embedding model...")
-        embedding_model = OllamaEmbeddings(model="nomic-embed-text")
+        embedding_model = OllamaEmbeddings(model=model_name)
 
         # Load the dataset
         print(f"Loading data from {file_path}...")
         df = pd.read_csv(file_path)
-        if 'question' not in df.columns or 'answer' not in df.columns or 'focus_area' not in df.columns:
-            raise ValueError("CSV must contain 'question', 'answer', and 'focus_area' columns.")
-
-        # --- FIX: Clean the data by dropping rows with missing values ---
-        # This prevents the ValidationError by ensuring all data is valid before processing.
         print(f"Original number of rows: {len(df)}")
-        df.dropna(subset=['question', 'answer', 'focus_area'], inplace=True)
+        df = clean_rows(df)
         print(f"Number of rows after cleaning: {len(df)}")
 
-        # Create LangChain Document objects with metadata
-        print(f"Creating {len(df)} documents with metadata...")
-        docs = [
-            Document(
-                page_content=row["answer"],
-                metadata={"focus_area": row["focus_area"], "question": row["question"]}
-            )
-            for _, row in df.iterrows()
-        ]
+        # Collapse repeated and near-identical answers so each is embedded once
+        detector = DuplicateDetector(mode=dedup_mode, threshold=dedup_threshold)
+        num_rows = len(df)
+        df = collapse_duplicates(df, detector)
+        print(f"Deduplication ({dedup_mode}): {num_rows} rows -> {len(df)} unique answers "
+              f"({detector.exact_duplicates} exact, {detector.near_duplicates} near duplicates).")
+
+        checkpoint = open_checkpoint(output_path, model_name)
+        pipeline = EmbeddingPipeline(embedding_model, batch_size=batch_size, max_workers=concurrency)
+        embedded = embed_pending_rows(df, checkpoint, pipeline)
+        print(f"{len(df) - embedded} answers reused stored embeddings; {embedded} answers were embedded.")
+
+        # Rows that were deleted or edited in the CSV leave stale embeddings behind
+        removed = checkpoint.prune(set(df['answer_hash']))
+        print(f"Dropped {removed} stored embeddings for deleted or changed answers.")
 
-        # Create a single FAISS vector store from all documents
-        print("Creating the unified FAISS vector store...")
-        vector_store = FAISS.from_documents(docs, embedding_model)
+        # Create a single FAISS vector store from the stored embeddings
+        print(f"Creating the unified {index_type} FAISS vector store from {len(df)} documents...")
+        writer = IndexWriter(output_path, index_type, index_params)
+        vectors = np.stack([checkpoint.get(h) for h in df['answer_hash']])
+        ids = writer.add(vectors, df['answer'].tolist(), row_metadatas(df))
+
+        # Per-focus-area centroids for two-stage retrieval, per-category prototypes and the BM25 index
+        centroids = FocusAreaCentroidBuilder()
+        prototypes = CategoryPrototypeBuilder(load_category_labels(category_labels) if category_labels else None)
+        bm25 = BM25Builder()
+        for doc_id, vector, sources, answer in zip(ids, vectors, df['sources'], df['answer']):
+            focus_areas = [source['focus_area'] for source in sources]
+            centroids.add(doc_id, vector, focus_areas)
+            prototypes.add(vector, focus_areas, answer)
+            bm25.add(doc_id, bm25_text(sources, answer))
 
         # Save the single vector store to a file
         print(f"Saving the vector store to {output_path}...")
-        vector_store.save_local(output_path)
+        writer.close()
+        print(f"Saved centroids for {centroids.save(output_path)} focus areas.")
+        save_category_prototypes(prototypes, output_path)
+        print(f"Saved the BM25 index with {bm25.save(output_path)} terms.")
+        write_manifest(output_path, build_manifest(file_path, model_name, writer.count, DOCSTORE_ARENA,
+                                                   index_type, writer.index_params))
 
         print("--- Pre-processing Complete! ---")
         print(f"You can now run your main.py file.")
@@ -59,6 +302,126 @@ def create_and_save_vector_store(file_path: str, output_path: str):
         print(f"An error occurred during pre-processing: {e}")
 
 
+def stream_and_save_vector_store(file_path: str, output_path: str, model_name: str = "nomic-embed-text",
+                                 batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+                                 chunk_size: int = STREAM_CHUNK_SIZE, dedup_mode: str = DEFAULT_DEDUP_MODE,
+                                 dedup_threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                                 index_type: str = DEFAULT_INDEX_TYPE, index_params: dict = None,
+                                 category_labels: str = None):
+    """
+    Streaming variant of create_and_save_vector_store for corpora that do not fit in memory.
+    The CSV is read chunk_size rows at a time; each chunk is embedded, added to the
+    FAISS index and appended to the arena docstore before the next chunk is read, so the
+    CSV rows, answer texts and per-chunk vectors are never all in memory at once.
+    Still grows with the corpus: the FAISS index, the row hashes (live_hashes, doc_ids,
+    the checkpoint's locations and the detector's exact map, plus MinHash signatures in
+    "near" mode), the BM25 postings, the focus-area member lists, and at close the
+    duplicate rows' extra sources, which are read back to finish the docstore.
+    """
+    print("--- Starting Streaming Pre-processing ---")
+
+    try:
+        print("Initializing embedding model...")
+        embedding_model = OllamaEmbeddings(model=model_name)
+        checkpoint = open_checkpoint(output_path, model_name)
+        pipeline = EmbeddingPipeline(embedding_model, batch_size=batch_size, max_workers=concurrency)
+        writer = IndexWriter(output_path, index_type, index_params)
+        detector = DuplicateDetector(mode=dedup_mode, threshold=dedup_threshold)
+        centroids = FocusAreaCentroidBuilder()
+        prototypes = CategoryPrototypeBuilder(load_category_labels(category_labels) if category_labels else None)
+        bm25 = BM25Builder()
+        doc_ids = {}  # canonical content hash -> (doc id, answer hash)
+
+        def record_written_duplicate(key: str, source: dict):
+            doc_id, answer_key = doc_ids[key]
+            writer.add_source(doc_id, source)
+            centroids.add(doc_id, checkpoint.get(answer_key), [source['focus_area']])
+            bm25.add(doc_id, bm25_text([source]))
+
+        live_hashes = set()
+        total_rows = 0
+        cleaned_rows = 0
+
+        print(f"Streaming data from {file_path} in chunks of {chunk_size} rows...")
+        for chunk_number, chunk in enumerate(pd.read_csv(file_path, chunksize=chunk_size), start=1):
+            total_rows += len(chunk)
+            chunk = clean_rows(chunk)
+            cleaned_rows += len(chunk)
+            unique = collapse_duplicates(chunk, detector, doc_ids, record_written_duplicate)
+            if unique.empty:
+                continue
+            live_hashes.update(unique['answer_hash'])
+            embedded = embed_pending_rows(unique, checkpoint, pipeline)
+
+            vectors = np.stack([checkpoint.get(h) for h in unique['answer_hash']])
+            ids = writer.add(vectors, unique['answer'].tolist(), row_metadatas(unique))
+            doc_ids.update(zip(unique['content_hash'], zip(ids, unique['answer_hash'])))
+            for doc_id, vector, sources, answer in zip(ids, vectors, unique['sources'], unique['answer']):
+                focus_areas = [source['focus_area'] for source in sources]
+                centroids.add(doc_id, vector, focus_areas)
+                prototypes.add(vector, focus_areas, answer)
+                bm25.add(doc_id, bm25_text(sources, answer))
+            print(f"Chunk {chunk_number}: {len(unique)} unique answers indexed ({embedded} newly embedded), "
+                  f"{writer.count} documents so far.")
+
+        print(f"Read {total_rows} rows; {cleaned_rows} remained after cleaning and {writer.count} after "
+              f"deduplication ({detector.exact_duplicates} exact, {detector.near_duplicates} near duplicates).")
+        removed = checkpoint.prune(live_hashes)
+        print(f"Dropped {removed} stored embeddings for deleted or changed answers.")
+
+        print(f"Saving the vector store to {output_path}...")
+        writer.close()
+        print(f"Saved centroids for {centroids.save(output_path)} focus areas.")
+        save_category_prototypes(prototypes, output_path)
+        print(f"Saved the BM25 index with {bm25.save(output_path)} terms.")
+        write_manifest(output_path, build_manifest(file_path, model_name, writer.count, DOCSTORE_ARENA,
+                                                   index_type, writer.index_params))
+
+        print("--- Pre-processing Complete! ---")
+
+    except Exception as e:
+        print(f"An error occurred during streaming pre-processing: {e}")
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the FAISS symptom index from medquad.csv.")
+    parser.add_argument("--file", default="medquad.csv", help="Path to the source CSV.")
     # The output path is now a folder name for the FAISS index
-    create_and_save_vector_store(file_path="medquad.csv", output_path="faiss_index")
+    parser.add_argument("--output", default="faiss_index", help="Folder to write the FAISS index to.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Rows per embedding request; each finished batch is checkpointed.")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY,
+                        help="Maximum embedding requests in flight at once.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the CSV in chunks and build the index incrementally with bounded memory.")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE,
+                        help="CSV rows read per chunk in --stream mode.")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=DEFAULT_DEDUP_MODE,
+                        help="Collapse exact (default) or near-duplicate answers before embedding. "
+                             "'near' also merges templated answers that differ only in the disease name.")
+    parser.add_argument("--dedup-threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                        help="Estimated Jaccard similarity above which two answers count as near duplicates.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=DEFAULT_INDEX_TYPE,
+                        help="FAISS index to build: exact 'flat', or approximate 'hnsw', 'ivf-flat', 'ivf-pq'.")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW neighbours per node.")
+    parser.add_argument("--nlist", type=int, help="Number of IVF cells.")
+    parser.add_argument("--nprobe", type=int, help="IVF cells searched per query.")
+    parser.add_argument("--pq-m", type=int, help="Number of PQ sub-quantizers for ivf-pq.")
+    parser.add_argument("--category-labels",
+                        help="Optional focus_area,category CSV used to build the body-system prototypes; "
+                             "unlisted focus areas are labelled by keyword.")
+    args = parser.parse_args()
+
+    cli_index_params = {
+        key: value for key, value in
+        {"hnsw_m": args.hnsw_m, "nlist": args.nlist, "nprobe": args.nprobe, "pq_m": args.pq_m}.items()
+        if value is not None
+    }
+    build_options = dict(file_path=args.file, output_path=args.output, batch_size=args.batch_size,
+                         concurrency=args.concurrency, dedup_mode=args.dedup, dedup_threshold=args.dedup_threshold,
+                         index_type=args.index_type, index_params=cli_index_params,
+                         category_labels=args.category_labels)
+    if args.stream:
+        stream_and_save_vector_store(chunk_size=args.chunk_size, **build_options)
+    else:
+        create_and_save_vector_store(**build_options)
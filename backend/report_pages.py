@@ -0,0 +1,61 @@
+# File: report_pages.py
+# Splits an upload into report pages for the extractor: every page of a PDF, or
+# each photo when several were uploaded together. PDF support is optional and
+# needs pypdfium2 (pip install pypdfium2).
+
+import os
+
+from PIL import Image
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# app.py only accepts PDF uploads when the renderer is installed
+PDF_SUPPORTED = pdfium is not None
+
+# --- Page Configuration ---
+# 2.0 renders at 144 dpi, plenty for OCR once the normalizer caps the size
+PDF_RENDER_SCALE = float(os.environ.get("PDF_RENDER_SCALE", "2.0"))
+MAX_REPORT_PAGES = int(os.environ.get("MAX_REPORT_PAGES", "20"))
+
+
+def _pdf_pages(pdf_path: str, max_pages: int) -> list:
+    if pdfium is None:
+        raise ImportError("PDF reports need the 'pypdfium2' package. Install it with: pip install pypdfium2")
+    # pdfium is not thread-safe, so pages are rendered here and only OCR runs concurrently
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        # Checked before rendering, so an oversized PDF is never rasterized
+        if len(pdf) > max_pages:
+            raise ValueError(f"The report has more than {MAX_REPORT_PAGES} pages.")
+        pages = [pdf[i].render(scale=PDF_RENDER_SCALE).to_pil() for i in range(len(pdf))]
+    finally:
+        pdf.close()
+    # A rendered page has no encoding of its own; each gets an equal share of the PDF's size
+    for page in pages:
+        page.info["source_bytes"] = os.path.getsize(pdf_path) // max(1, len(pages))
+    return pages
+
+
+def load_report_pages(paths: list) -> list:
+    """
+    Returns the report's pages as PIL images, in upload order. Each page's info["source_bytes"]
+    holds the size of the upload it came from, the "before" of the extractor's payload logging.
+    """
+    pages = []
+    for path in paths:
+        if path.lower().endswith(".pdf"):
+            pages.extend(_pdf_pages(path, MAX_REPORT_PAGES - len(pages)))
+        else:
+            with Image.open(path) as img:
+                page = img.copy()
+                # The extractor sends the file itself when it beats the normalized encoding
+                page.info["source_format"] = img.format
+            page.info["source_path"] = path
+            page.info["source_bytes"] = os.path.getsize(path)
+            pages.append(page)
+        if len(pages) > MAX_REPORT_PAGES:
+            raise ValueError(f"The report has more than {MAX_REPORT_PAGES} pages.")
+    return pages
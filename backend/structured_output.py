@@ -0,0 +1,121 @@
+# File: structured_output.py
+# Schema-constrained JSON replies from the text model.
+# The declared schema is passed to Ollama as the response format, so the model
+# decodes straight into JSON of that shape. The reply is then parsed and checked
+# against the schema; if that still fails, the model gets one short repair turn
+# showing its own reply and the validation error instead of the caller failing
+# the whole conversation turn.
+#
+# Schemas use the JSON Schema subset below: "type" (a name or a list of names),
+# "properties", "required" and "items".
+
+import json
+import os
+import re
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_ollama import ChatOllama
+
+from metrics import metrics
+
+# --- Structured Output Configuration ---
+STRUCTURED_OUTPUT_REPAIR = os.environ.get("STRUCTURED_OUTPUT_REPAIR", "1") == "1"
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def extract_json(content: str) -> dict:
+    """Parses a JSON object from a reply, tolerating markdown fences and surrounding prose."""
+    content = content.strip()
+    if content.startswith("{"):
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            pass
+    match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", content, re.DOTALL)
+    if not match:
+        match = re.search(r"(\{.*\})", content, re.DOTALL)
+        if not match:
+            raise StructuredOutputError("No JSON object found in the reply.")
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Invalid JSON: {e}") from e
+
+
+def validate(value, schema: dict, path: str = "$"):
+    """Raises StructuredOutputError describing the first place where value does not match schema."""
+    expected = schema.get("type")
+    if expected:
+        names = expected if isinstance(expected, list) else [expected]
+        # bool is an int in Python but not a JSON number
+        matches = any(isinstance(value, _JSON_TYPES[name]) and not (isinstance(value, bool) and name in ("number", "integer"))
+                      for name in names)
+        if not matches:
+            raise StructuredOutputError(f"{path} should be {' or '.join(names)}, got {type(value).__name__}.")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                raise StructuredOutputError(f"{path} is missing the required key '{key}'.")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                validate(value[key], sub_schema, f"{path}.{key}")
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{i}]")
+
+
+def _invoke(model, messages: list, schema: dict):
+    if isinstance(model, ChatOllama):
+        return model.invoke(messages, format=schema)
+    # Other chat models have no schema-constrained decoding; the prompt and validation still apply
+    return model.invoke(messages)
+
+
+def invoke_structured(model, messages: list, schema: dict, name: str) -> dict:
+    """
+    Asks the model for a JSON object matching schema and returns it parsed and validated.
+    Makes at most one repair attempt; raises StructuredOutputError if that fails too.
+    Metrics: structured_output.<name>.calls / parse_failures / repairs / repair_failures.
+    """
+    metrics.increment(f"structured_output.{name}.calls")
+    with metrics.timer(f"structured_output.{name}"):
+        response = _invoke(model, messages, schema)
+    try:
+        result = extract_json(response.content)
+        validate(result, schema)
+        return result
+    except StructuredOutputError as e:
+        metrics.increment(f"structured_output.{name}.parse_failures")
+        if not STRUCTURED_OUTPUT_REPAIR:
+            raise
+        error = e
+    print(f"---Structured Output---: Reply for '{name}' was invalid ({error}). Asking for a repair.")
+    metrics.increment(f"structured_output.{name}.repairs")
+    repair_messages = list(messages) + [
+        AIMessage(content=response.content),
+        HumanMessage(content=f"That reply is not valid: {error}\n"
+                             f"Reply with ONLY the corrected JSON object, matching this JSON schema:\n"
+                             f"{json.dumps(schema)}"),
+    ]
+    with metrics.timer(f"structured_output.{name}.repair"):
+        response = _invoke(model, repair_messages, schema)
+    try:
+        result = extract_json(response.content)
+        validate(result, schema)
+        return result
+    except StructuredOutputError:
+        metrics.increment(f"structured_output.{name}.repair_failures")
+        raise
@@ -0,0 +1,87 @@
+# File: upload_store.py
+# Content-addressed storage for uploaded report images.
+# Uploads are streamed to a temporary file while being hashed and then stored as
+# blobs/<first two hex chars>/<sha256>.<ext>, so identical files are kept once and
+# two users' "report.png" never overwrite each other. The saved chat sessions are the
+# only record of which blobs are in use: collect_garbage() scans their image_path /
+# image_paths and removes every blob that none of them points to.
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from metrics import metrics
+
+# --- Upload Store Configuration ---
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Blobs younger than this survive GC, covering uploads whose session state is not saved yet
+UPLOAD_GC_GRACE_SECONDS = float(os.environ.get("UPLOAD_GC_GRACE_SECONDS", "600"))
+BLOB_DIR_NAME = "blobs"
+# Spellings of the same format share one blob
+EXTENSION_ALIASES = {"jpeg": "jpg"}
+
+
+class UploadStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_dir = os.path.join(root, BLOB_DIR_NAME)
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str, extension: str) -> str:
+        extension = extension.lower()
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{EXTENSION_ALIASES.get(extension, extension)}")
+
+    def save_stream(self, stream, extension: str) -> str:
+        """Streams an upload to disk while hashing it and returns the path of its blob."""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".upload")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+            path = self.blob_path(digest.hexdigest(), extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._lock:
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                    # Restart the GC grace period for the reused blob
+                    os.utime(path)
+                    metrics.increment("upload_store.deduplicated")
+                else:
+                    os.replace(tmp_path, path)
+                    metrics.increment("upload_store.stored")
+            return path
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def collect_garbage(self, session_image_paths: dict) -> int:
+        """
+        Deletes blobs that no saved session points to. session_image_paths maps every saved
+        session id to the list of its image paths (database.get_session_image_paths()).
+        """
+        live = {os.path.normpath(p) for paths in session_image_paths.values() for p in paths}
+        cutoff = time.time() - UPLOAD_GC_GRACE_SECONDS
+        removed = 0
+        with self._lock:
+            for directory, _, files in os.walk(self.blob_dir):
+                for name in files:
+                    path = os.path.normpath(os.path.join(directory, name))
+                    if path in live or os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                    removed += 1
+            # Leftovers of uploads interrupted before they were hashed
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.endswith(".upload") and os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+        metrics.increment("upload_store.collected", removed)
+        if removed:
+            print(f"---Upload Store---: Removed {removed} unreferenced upload(s).")
+        return removed
@@ -568,10 +568,12 @@ const ChatInterface = ({ messages, onSendMessage, onFileUpload, onToggleSidebar,
   };
 
   const handleFileChange = (e) => {
-    const file = e.target.files[0];
-    if (file && !isLoading) {
-      onFileUpload(file);
+    // Several photos of one report are uploaded together as its pages
+    const files = Array.from(e.target.files);
+    if (files.length && !isLoading) {
+      onFileUpload(files);
     }
+    e.target.value = '';
   };
 
   return (
@@ -627,6 +629,7 @@ const ChatInterface = ({ messages, onSendMessage, onFileUpload, onToggleSidebar,
           onChange={handleFileChange}
           style={{ display: 'none' }}
           accept="image/*,.pdf,.txt"
+          multiple
           disabled={isLoading}
         />
       </div>
@@ -917,24 +920,25 @@ export default function App() {
     }
   };
 
-  // Upload a file
-  const handleFileUpload = async (file) => {
+  // Upload one or more files (the pages of a single report)
+  const handleFileUpload = async (files) => {
     if (!activeChatId) {
       console.error('❌ No active chat ID');
       setError('No active chat. Please create a new chat.');
       return;
     }
 
-    console.log('📎 Uploading file:', file.name);
+    const fileNames = files.map((file) => file.name).join(', ');
+    console.log('📎 Uploading file(s):', fileNames);
 
-    const userMessage = { type: 'human', content: `Uploaded file: ${file.name}` };
+    const userMessage = { type: 'human', content: `Uploaded file: ${fileNames}` };
     const newMessages = [...messages, userMessage];
     setMessages(newMessages);
     setIsLoading(true);
     setError(null);
 
     const formData = new FormData();
-    formData.append('report_image', file);
+    files.forEach((file) => formData.append('report_image', file));
     formData.append('session_id', activeChatId);
 
     try {